@@ -1,7 +1,9 @@
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
 from pymongo import MongoClient
 import os
+from utils.static_assets import StaticAssets
+from utils.upload_store import make_request_class
 
 app = Flask(__name__)
 
@@ -27,30 +29,42 @@ mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 client = MongoClient(mongo_uri)
 db = client["scorgal"]
 clauses_collection = db["clauses"]
+summaries_collection = db["summaries"]
 
 # ✅ Import routes after attaching cache + db
 from routes.route_upload import upload_bp
 from routes.route_analyze import analyze_bp
 from routes.route_chat import chat_bp   # 👈 NEW
 from routes.route_chat_global import chat_global_bp
+from routes.route_documents import documents_bp
 
 app.register_blueprint(upload_bp, url_prefix="/api")
 app.register_blueprint(analyze_bp, url_prefix="/api")
 app.register_blueprint(chat_bp, url_prefix="/api")
 app.register_blueprint(chat_global_bp, url_prefix="/api")
+app.register_blueprint(documents_bp, url_prefix="/api")
 
 # Make db available in blueprints
 app.clauses_collection = clauses_collection
 
-# ✅ Serve frontend (dist folder)
+# Chunk summaries persist across restarts → repeated uploads reuse them
+from routes.route_upload import summary_engine, upload_store
+summary_engine.collection = summaries_collection
+
+# Uploaded files stream into the content-addressed store while the form is parsed.
+# Anything bigger than the whole store gets a 413 from its Content-Length. Under
+# asgi.py that check happens before asgiref copies the body to its own temp file,
+# so accepted uploads are still written twice there.
+app.request_class = make_request_class(upload_store)
+app.config["MAX_CONTENT_LENGTH"] = upload_store.max_bytes
+
+# ✅ Serve frontend (dist folder) from a manifest built once at startup
+static_assets = StaticAssets(os.path.join(os.path.dirname(__file__), "static"))
+
 @app.route("/", defaults={"path": ""})
 @app.route("/<path:path>")
 def serve(path):
-    static_dir = os.path.join(os.path.dirname(__file__), "static")
-    if path != "" and os.path.exists(os.path.join(static_dir, path)):
-        return send_from_directory(static_dir, path)
-    else:
-        return send_from_directory(static_dir, "index.html")
+    return static_assets.serve(path)
 
 if __name__ == "__main__":
     print("[DEBUG] SCORGAL backend starting...")
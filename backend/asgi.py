@@ -0,0 +1,93 @@
+# asgi.py
+# ASGI entrypoint: LLM-bound endpoints run on the event loop (Quart),
+# everything else (upload, reset, static files) is the unchanged Flask app.
+#
+#   gunicorn asgi:application -k uvicorn.workers.UvicornWorker
+import json
+from asgiref.wsgi import WsgiToAsgi
+from quart import Quart
+from quart_cors import cors
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app import app as flask_app, mongo_uri
+from routes.route_async import async_bp
+from routes.route_upload import too_large_body
+
+ALLOW_ORIGIN = "https://scorgal.vercel.app"
+
+async_app = Quart(__name__)
+async_app = cors(
+    async_app,
+    allow_origin=ALLOW_ORIGIN,
+    allow_credentials=True,
+    allow_headers=["Content-Type", "Authorization"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+)
+async_app.flask_app = flask_app   # shared doc_cache lives here
+async_app.register_blueprint(async_bp, url_prefix="/api")
+
+
+@async_app.before_serving
+async def connect_mongo():
+    # motor binds to the running loop → create it once the server has started
+    client = AsyncIOMotorClient(mongo_uri)
+    async_app.clauses_collection = client["scorgal"]["clauses"]
+
+
+ASYNC_PATHS = {
+    "/api/analyze_clause",
+    "/api/chat_clause",
+    "/api/chat_doc",
+    "/api/chat_global",
+}
+
+# WsgiToAsgi reads the whole body into a temp file before Flask sees the
+# request, so Flask's MAX_CONTENT_LENGTH check would only fire after an
+# oversized upload is already on disk → refuse it here from the headers.
+wsgi_app = WsgiToAsgi(flask_app)
+UPLOAD_PATH = "/api/upload"
+
+
+def content_length(scope):
+    """Declared Content-Length (None if absent or malformed)."""
+    for name, value in scope.get("headers", []):
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+async def refuse(send, status, body):
+    """Answer without reading the request body (CORS headers so the frontend can read it)."""
+    payload = json.dumps(body).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode("ascii")),
+            (b"access-control-allow-origin", ALLOW_ORIGIN.encode("ascii")),
+            (b"access-control-allow-credentials", b"true"),
+            (b"connection", b"close"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan" or scope.get("path") in ASYNC_PATHS:
+        await async_app(scope, receive, send)
+        return
+
+    if scope["type"] == "http" and scope["method"] == "POST":
+        length = content_length(scope)
+        if length is not None and length > flask_app.config["MAX_CONTENT_LENGTH"]:
+            await refuse(send, 413, too_large_body())
+            return
+        if length is None and scope["path"] == UPLOAD_PATH:
+            # chunked upload → no way to refuse it before asgiref spools all of it
+            await refuse(send, 411, {"error": "Content-Length required"})
+            return
+    await wsgi_app(scope, receive, send)
@@ -0,0 +1,99 @@
+# bench_load.py
+"""
+Concurrent-session load test for the chat endpoint.
+
+    python bench_load.py http://localhost:8000 [sessions] [requests_per_session]
+
+Run it once against the sync server (gunicorn app:app) and once against
+the ASGI server (gunicorn asgi:application -k uvicorn.workers.UvicornWorker),
+each with a single worker, and compare throughput and latency.
+
+To measure the serving stack alone (no Gemini quota / network noise), start
+the servers through simulated(), which answers every Gemini call after
+BENCH_GEMINI_LATENCY seconds (default 1.0) and fills the doc cache:
+
+    gunicorn -w 1 -b :8001 'bench_load:simulated("wsgi")'
+    gunicorn -w 1 -b :8002 -k uvicorn.workers.UvicornWorker 'bench_load:simulated("asgi")'
+"""
+import os, sys, json, time, asyncio, statistics, urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def simulated(kind: str):
+    """App with a fixed-latency stand-in for Gemini (benchmark only)."""
+    fake_keys = ",".join(f"bench-key-{i}" for i in range(100))   # admission never the bottleneck
+    for var in ("GEMINI_KEYS", "GEMINI_KEYS_CHAT", "GEMINI_KEYS_OCR"):
+        os.environ.setdefault(var, fake_keys)
+    latency = float(os.getenv("BENCH_GEMINI_LATENCY", "1.0"))
+
+    class Reply:
+        text = "Simulated answer."
+
+    class Model:
+        def generate_content(self, prompt):
+            time.sleep(latency)
+            return Reply()
+
+        async def generate_content_async(self, prompt):
+            await asyncio.sleep(latency)
+            return Reply()
+
+    import utils.gemini
+    utils.gemini.model_for = lambda api_key: Model()
+    utils.gemini.amodel_for = lambda api_key: Model()
+
+    from app import app
+    app.doc_cache = {
+        "filename": "bench.pdf", "doc_id": "bench", "summary": "A simulated contract summary.",
+        "clauses": [{"id": "clause_1", "original": "1. The Tenant shall pay rent monthly."}],
+    }
+    if kind == "wsgi":
+        return app
+    from asgi import application
+    return application
+
+
+def ask(base, message):
+    req = urllib.request.Request(
+        f"{base}/api/chat_global",
+        data=json.dumps({"message": message}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            resp.read()
+            ok = resp.status == 200
+    except Exception:
+        ok = False
+    return ok, time.perf_counter() - start
+
+
+def session(base, n):
+    return [ask(base, f"What does clause {i + 1} mean for me?") for i in range(n)]
+
+
+def main():
+    base = sys.argv[1].rstrip("/")
+    sessions = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    per_session = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = [r for rs in pool.map(lambda _: session(base, per_session), range(sessions)) for r in rs]
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(t for ok, t in results if ok)
+    errors = sum(1 for ok, _ in results if not ok)
+    print(f"sessions           {sessions} x {per_session} requests")
+    print(f"completed          {len(latencies)} ok, {errors} failed in {elapsed:.1f}s")
+    print(f"throughput         {len(latencies) / elapsed:.2f} req/s")
+    if latencies:
+        print(f"latency            p50 {latencies[len(latencies) // 2]:.2f}s, "
+              f"p95 {latencies[int(len(latencies) * 0.95)]:.2f}s, "
+              f"mean {statistics.mean(latencies):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# bench_similarity.py
+"""
+Near-duplicate clause lookup benchmark over the sample uploads.
+
+    python bench_similarity.py [threshold]
+
+Documents are indexed one after another; every clause is looked up before
+it is added, so "cross-doc hits" are clauses that would have reused an
+analysis from an earlier document. "Near-dup recall" looks up lightly
+reworded copies (word dropped, party renamed) of every indexed clause.
+Only needs the parsing deps (pdfplumber, python-docx) — no keys, Mongo or app startup.
+"""
+import os, sys, time, random, statistics
+import pdfplumber
+from docx import Document
+
+from utils.file_parser import clean_text, split_into_clauses
+from utils.similarity import ClauseIndex, minhash
+
+SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
+
+
+def extract(path):
+    if path.lower().endswith(".pdf"):
+        with pdfplumber.open(path) as pdf:
+            return "".join(page.extract_text() or "" for page in pdf.pages)
+    if path.lower().endswith(".docx"):
+        return "\n".join(p.text for p in Document(path).paragraphs)
+    return ""   # images need OCR → skipped
+
+
+def reword(text, rng):
+    words = text.split()
+    if len(words) > 10:
+        del words[rng.randrange(len(words))]
+    return " ".join(words).replace("Company", "Corporation").replace("Party", "Parties")
+
+
+def timed_lookup(index, text, threshold, exclude=None):
+    start = time.perf_counter()
+    match = index.lookup(minhash(text), text, threshold, exclude=exclude)
+    return match, (time.perf_counter() - start) * 1e6
+
+
+def main():
+    threshold = float(sys.argv[1]) if len(sys.argv) > 1 else 0.92
+    rng = random.Random(0)
+    index = ClauseIndex()
+    latencies, hits, total = [], 0, 0
+    indexed = []
+
+    for name in sorted(os.listdir(SAMPLES)):
+        text = clean_text(extract(os.path.join(SAMPLES, name)))
+        if not text:
+            continue
+        clauses = split_into_clauses(text)
+        for c in clauses:
+            match, us = timed_lookup(index, c["original"], threshold)
+            latencies.append(us)
+            total += 1
+            if match and match[0] != name:
+                hits += 1
+        for c in clauses:
+            index.add(name, c["id"], minhash(c["original"]), c["original"])
+            indexed.append((name, c["id"], c["original"]))
+        print(f"{name:<70} {len(clauses):>4} clauses")
+
+    recall_hits = 0
+    for name, cid, original in indexed:
+        match, us = timed_lookup(index, reword(original, rng), threshold)
+        latencies.append(us)
+        if match and match[:2] == (name, cid):
+            recall_hits += 1
+
+    latencies.sort()
+    print()
+    print(f"threshold          {threshold}")
+    print(f"indexed clauses    {len(index)}")
+    print(f"cross-doc hits     {hits}/{total} ({100 * hits / max(total, 1):.1f}%)")
+    print(f"near-dup recall    {recall_hits}/{len(indexed)} ({100 * recall_hits / max(len(indexed), 1):.1f}%)")
+    if latencies:
+        print(f"lookup latency     mean {statistics.mean(latencies):.0f} µs, "
+              f"p50 {latencies[len(latencies) // 2]:.0f} µs, "
+              f"p95 {latencies[int(len(latencies) * 0.95)]:.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
 # key_manager.py
-import os, time
+import os, time, threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# allow ~55 calls/min per key
+CALLS_PER_MINUTE = 55
+# a key that got a quota error rests this long unless the server says otherwise
+QUOTA_COOLDOWN = 60
+
 class GeminiKeyManager:
     def __init__(self, env_var: str = "GEMINI_KEYS"):
         """
@@ -20,7 +25,9 @@ class GeminiKeyManager:
         self.keys = [k.strip() for k in keys_str.split(",") if k.strip()]
         self.index = 0
         self.usage = {k: [] for k in self.keys}
+        self.cooldown = {}  # key → time it may be used again after a quota error
         self.env_var = env_var
+        self.lock = threading.RLock()  # keys are shared across request + worker threads
         print(f"[INIT] Loaded {len(self.keys)} Gemini API keys from {env_var}.")
 
     def get_key(self, return_meta: bool = False):
@@ -28,30 +35,137 @@ class GeminiKeyManager:
         Returns a key that is under per-minute quota.
         Rotates if the current one is overloaded.
         """
-        now = time.time()
-        key = self.keys[self.index]
+        with self.lock:
+            now = time.time()
+            key = self.keys[self.index]
+
+            # cleanup old usage
+            self.usage[key] = [t for t in self.usage[key] if now - t < 60]
+
+            if self._cooling(key, now):
+                return self.rotate_key(return_meta)
 
-        # cleanup old usage
-        self.usage[key] = [t for t in self.usage[key] if now - t < 60]
+            if len(self.usage[key]) < CALLS_PER_MINUTE:
+                self.usage[key].append(now)
+                count = len(self.usage[key])
+                if return_meta:
+                    return key, self.index + 1, len(self.keys), count
+                return key
+            else:
+                print(f"[WARN] Key {self.index+1}/{len(self.keys)} ({self.env_var}) hit per-minute limit → rotating…")
+                return self.rotate_key(return_meta)
+
+    def least_used_key(self, return_meta: bool = False):
+        """
+        Per-call pick for fan-out callers (summary map/reduce): the key with
+        the fewest calls this minute, skipping keys cooling down, so parallel
+        calls spread over the pool instead of piling onto the current key.
+        Falls back to get_key() when every key is full or cooling.
+        """
+        with self.lock:
+            now = time.time()
+            best = None
+            for i, key in enumerate(self.keys):
+                if self._cooling(key, now):
+                    continue
+                self.usage[key] = [t for t in self.usage[key] if now - t < 60]
+                used = len(self.usage[key])
+                if used < CALLS_PER_MINUTE and (best is None or used < len(self.usage[self.keys[best]])):
+                    best = i
+            if best is None:
+                return self.get_key(return_meta)
 
-        # allow ~55 calls/min per key
-        if len(self.usage[key]) < 55:
+            key = self.keys[best]
             self.usage[key].append(now)
-            count = len(self.usage[key])
             if return_meta:
-                return key, self.index + 1, len(self.keys), count
+                return key, best + 1, len(self.keys), len(self.usage[key])
             return key
-        else:
-            print(f"[WARN] Key {self.index+1}/{len(self.keys)} ({self.env_var}) hit per-minute limit → rotating…")
-            return self.rotate_key(return_meta)
 
     def rotate_key(self, return_meta: bool = False):
         """
         Force rotate to the next key cyclically.
         """
-        self.index = (self.index + 1) % len(self.keys)
-        key = self.keys[self.index]
-        print(f"[KEY] Rotated → now using key {self.index+1}/{len(self.keys)} from {self.env_var}")
-        if return_meta:
-            return key, self.index + 1, len(self.keys), len(self.usage[key])
-        return key
+        with self.lock:
+            now = time.time()
+            for _ in range(len(self.keys)):  # skip keys cooling down (all cooling → plain next)
+                self.index = (self.index + 1) % len(self.keys)
+                if not self._cooling(self.keys[self.index], now):
+                    break
+            key = self.keys[self.index]
+            print(f"[KEY] Rotated → now using key {self.index+1}/{len(self.keys)} from {self.env_var}")
+            if return_meta:
+                return key, self.index + 1, len(self.keys), len(self.usage[key])
+            return key
+
+    def _cooling(self, key, now) -> bool:
+        until = self.cooldown.get(key)
+        if until is not None and until <= now:
+            del self.cooldown[key]
+            until = None
+        return until is not None
+
+    def mark_exhausted(self, key, retry_after: float = None):
+        """
+        Gemini refused `key` for quota → take it out of the pool until the
+        server's retry hint (or QUOTA_COOLDOWN) has passed.
+        """
+        with self.lock:
+            wait = retry_after if retry_after else QUOTA_COOLDOWN
+            self.cooldown[key] = max(self.cooldown.get(key, 0), time.time() + wait)
+            print(f"[KEY] Key {self.keys.index(key)+1}/{len(self.keys)} ({self.env_var}) cooling down for {wait:.0f}s")
+
+    def spare_capacity(self) -> int:
+        """
+        Calls still available across the whole pool in the current minute
+        window (keys cooling down after a quota error count as 0).
+        """
+        with self.lock:
+            now = time.time()
+            spare = 0
+            for key in self.keys:
+                if self._cooling(key, now):
+                    continue
+                self.usage[key] = [t for t in self.usage[key] if now - t < 60]
+                spare += max(0, CALLS_PER_MINUTE - len(self.usage[key]))
+            return spare
+
+    def seconds_until_available(self, calls: int) -> float:
+        """
+        Rough wait until `calls` more calls fit in the pool's minute window
+        (0 if they fit now), used for Retry-After hints.
+        """
+        with self.lock:
+            now = time.time()
+            spare, releases = 0, []  # releases: (time, calls freed then)
+            for key in self.keys:
+                recent = [t for t in self.usage[key] if now - t < 60]
+                if self._cooling(key, now):
+                    releases.append((self.cooldown[key], CALLS_PER_MINUTE))
+                else:
+                    spare += max(0, CALLS_PER_MINUTE - len(recent))
+                    releases += [(t + 60, 1) for t in recent]
+            if calls <= spare:
+                return 0.0
+            at = now
+            for at, freed in sorted(releases):
+                spare += freed
+                if calls <= spare:
+                    break
+            return max(0.0, at - now)
+
+
+# -----------------------------
+# Shared pools (one per env var, per process)
+# -----------------------------
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_key_manager(env_var: str = "GEMINI_KEYS") -> GeminiKeyManager:
+    """
+    Return the process-wide manager for env_var so every module
+    draws from (and accounts against) the same key pool.
+    """
+    with _managers_lock:
+        if env_var not in _managers:
+            _managers[env_var] = GeminiKeyManager(env_var)
+        return _managers[env_var]
@@ -1,64 +1,82 @@
 from flask import Blueprint, request, jsonify, current_app
-import google.generativeai as genai
-from key_manager import GeminiKeyManager
+from utils.gemini import generate, agenerate
+from key_manager import get_key_manager
+from utils.scheduler import PriorityScheduler, PREFETCH
+from utils.similarity import ClauseIndex, minhash
+from utils.admission import get_admission_controller, Overloaded, overloaded_response
+from contextlib import nullcontext
 import json
+import os
 import time
 
 # -----------------------------
 # Blueprint + KeyManager
 # -----------------------------
 analyze_bp = Blueprint("analyze", __name__)
-key_manager = GeminiKeyManager()
+key_manager = get_key_manager()
+
+# Per-process scheduler: speculative prefetch after upload, user clicks first
+scheduler = PriorityScheduler(key_manager)
+
+# Requests wait for key-pool capacity (bounded, prioritized) or get a fast 429
+admission = get_admission_controller(key_manager)
+
+# Near-duplicate clauses (same boilerplate, tiny wording changes) reuse analyses.
+# The 64-perm estimate is only ±0.05, so the default stays well above 0.8.
+SIMILARITY_THRESHOLD = float(os.getenv("CLAUSE_SIMILARITY_THRESHOLD", "0.92"))  # >1 disables
+clause_index = ClauseIndex()
+
+# Rows saved before fallbacks were skipped hold "⚠️ No response" text → never serve or reuse them
+ANALYZED = {"model_used": {"$ne": "None"}}
 
 # -----------------------------
 # Gemini Call Helper
 # -----------------------------
+FALLBACK = {
+    "en": "⚠️ No response",
+    "hi": "⚠️ कोई उत्तर नहीं",
+    "mr": "⚠️ प्रतिसाद नाही"
+}
+
+def parse_gemini_text(text: str, idx, total, count):
+    """Strip markdown fences and parse JSON (raw text if it isn't JSON)."""
+    text = text.strip()
+
+    # 🚀 Clean markdown fences if present
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text.replace("json", "", 1)
+        text = text.strip()
+
+    try:
+        parsed = json.loads(text)
+        return parsed, f"Gemini (key {idx}/{total}, {count} calls)"
+    except Exception:
+        print("[WARN] Gemini returned non-JSON output:", text[:120])
+        return text, f"Gemini (key {idx}/{total}, {count} calls)"
+
 def call_gemini(prompt: str):
     """Call Gemini API with auto-rotation on quota/invalid key errors."""
-    for attempt in range(len(key_manager.keys)):  # try all keys at most once
-        try:
-            api_key, idx, total, count = key_manager.get_key(return_meta=True)
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel("gemini-1.5-flash")
-            response = model.generate_content(prompt)
-
-            if response and response.text:
-                text = response.text.strip()
-
-                # 🚀 Clean markdown fences if present
-                if text.startswith("```"):
-                    text = text.strip("`")
-                    text = text.replace("json", "", 1)
-                    text = text.strip()
-
-                try:
-                    parsed = json.loads(text)
-                    return parsed, f"Gemini (key {idx}/{total}, {count} calls)"
-                except Exception:
-                    print("[WARN] Gemini returned non-JSON output:", text[:120])
-                    return text, f"Gemini (key {idx}/{total}, {count} calls)"
-
-        except Exception as e:
-            msg = str(e).lower()
-            if "429" in msg or "quota" in msg:
-                print(f"[WARN] Gemini quota exceeded on key {idx} → rotating…")
-                key_manager.rotate_key()
-                continue
-            elif "api key not valid" in msg or "invalid" in msg:
-                print(f"[WARN] Gemini invalid key {idx} → rotating…")
-                key_manager.rotate_key()
-                continue
-            else:
-                print(f"[WARN] Gemini failed: {e}")
-                break
+    try:
+        text, meta = generate(key_manager, prompt)
+        if text:
+            return parse_gemini_text(text, *meta)
+    except Exception as e:
+        print(f"[WARN] Gemini failed: {e}")
 
     # 🚨 If all keys fail → fallback
-    return {
-        "en": "⚠️ No response",
-        "hi": "⚠️ कोई उत्तर नहीं",
-        "mr": "⚠️ प्रतिसाद नाही"
-    }, "None"
+    return dict(FALLBACK), "None"
+
+async def acall_gemini(prompt: str):
+    """Async twin of call_gemini (same rotation + fallback) for the ASGI path."""
+    try:
+        text, meta = await agenerate(key_manager, prompt)
+        if text:
+            return parse_gemini_text(text, *meta)
+    except Exception as e:
+        print(f"[WARN] Gemini failed: {e}")
 
+    return dict(FALLBACK), "None"
 
 
 # -----------------------------
@@ -83,58 +101,10 @@ def safe_extract(data, field):
 
 
 # -----------------------------
-# Main Route
+# Prompts + result shape (shared by the sync and async paths)
 # -----------------------------
-@analyze_bp.route("/analyze_clause", methods=["POST"])
-def analyze_clause():
-    data = request.get_json(silent=True) or {}
-    print("[DEBUG] Incoming JSON:", data)
-
-    clause_id = data.get("clause_id")
-    text = data.get("text", "")
-    filename = (
-        current_app.doc_cache.get("filename")
-        if hasattr(current_app, "doc_cache")
-        else "unknown"
-    )
-
-    # -----------------------------
-    # Empty clause guard
-    # -----------------------------
-    if not text.strip():
-        return jsonify({
-            "id": clause_id or "unknown",
-            "original": text,
-            "explanation": {
-                "en": "⚠️ Empty clause",
-                "hi": "⚠️ खाली क्लॉज",
-                "mr": "⚠️ रिकामी क्लॉज"
-            },
-            "risk": {
-                "en": "⚠️ Empty clause",
-                "hi": "⚠️ खाली क्लॉज",
-                "mr": "⚠️ रिकामी क्लॉज"
-            },
-            "model_used": "None"
-        }), 200
-
-    # -----------------------------
-    # Try MongoDB cache first
-    # -----------------------------
-    try:
-        existing = current_app.clauses_collection.find_one(
-            {"doc": filename, "id": clause_id},
-            {"_id": 0}
-        )
-        if existing:
-            print(f"[DEBUG] Cache hit for {clause_id} from MongoDB")
-            return jsonify(existing)
-    except Exception as e:
-        print(f"[WARN] MongoDB unavailable → skipping cache check: {e}")
-
-    # -----------------------------
-    # Step 1: Ask Gemini for Explanation + Risk in all 3 languages
-    # -----------------------------
+def build_prompts(text: str):
+    """Explanation + risk prompts for one clause."""
     explanation_prompt = f"""
     You are a multilingual assistant.
     Explain this legal clause in **English, Hindi, and Marathi**.
@@ -171,38 +141,211 @@ def analyze_clause():
     Clause:
     {text}
     """
+    return explanation_prompt, risk_prompt
+
+
+def build_result(doc_id, clause_id, text, explanation_json, risk_json, model_used):
+    """Flatten Gemini output (with safe_extract) into the stored/returned shape."""
+    return {
+        "doc": doc_id,
+        "id": clause_id,
+        "original": text,
+        "explanation": safe_extract(explanation_json, "explanation"),
+        "risk": safe_extract(risk_json, "risk"),
+        "model_used": model_used,
+    }
+
 
-    explanation_json, model_used = call_gemini(explanation_prompt)
-    risk_json, _ = call_gemini(risk_prompt)
+def build_reused_result(doc_id, clause_id, text, source, match):
+    """Stored analysis of a near-duplicate clause, re-labelled for this clause."""
+    src_doc, src_id, score = match
+    return {
+        "doc": doc_id,
+        "id": clause_id,
+        "original": text,
+        "explanation": source.get("explanation"),
+        "risk": source.get("risk"),
+        "model_used": source.get("model_used"),
+        "reused": True,
+        "reused_from": {"doc": src_doc, "id": src_id, "similarity": round(score, 3)},
+    }
 
+
+def empty_clause_result(clause_id, text):
+    return {
+        "id": clause_id or "unknown",
+        "original": text,
+        "explanation": {
+            "en": "⚠️ Empty clause",
+            "hi": "⚠️ खाली क्लॉज",
+            "mr": "⚠️ रिकामी क्लॉज"
+        },
+        "risk": {
+            "en": "⚠️ Empty clause",
+            "hi": "⚠️ खाली क्लॉज",
+            "mr": "⚠️ रिकामी क्लॉज"
+        },
+        "model_used": "None"
+    }
+
+
+# -----------------------------
+# Cache rules (shared by the sync and async paths)
+# -----------------------------
+CACHE_PROJECTION = {"_id": 0, "minhash": 0}
+
+
+def stored_analysis(result, signature, risk_model):
+    """
+    Document to upsert for a fresh analysis (signature stored alongside for
+    the similarity index), or None when either Gemini call fell back →
+    fallback text is not an analysis, never cache it.
+    """
+    if "None" in (result["model_used"], risk_model):
+        print(f"[WARN] Gemini fallback for {result['id']} → not saving to MongoDB")
+        return None
+    stored = dict(result)
+    if signature is not None:
+        stored["minhash"] = list(signature)
+    return stored
+
+
+# -----------------------------
+# Analysis
+# -----------------------------
+def run_analysis(doc_id, clause_id, text, collection, admit=nullcontext):
+    """
+    Explain + risk-score one clause, using the Mongo cache when possible.
+    Runs outside a request context when called from the scheduler, so the
+    collection is passed in explicitly. `admit` wraps the Gemini calls
+    (admission slot for user requests; prefetch is gated by the scheduler).
+    """
     # -----------------------------
-    # Step 2: Flatten Gemini output (with safe_extract)
+    # Try MongoDB cache first
     # -----------------------------
-    explanation = safe_extract(explanation_json, "explanation")
-    risk = safe_extract(risk_json, "risk")
+    try:
+        existing = collection.find_one({"doc": doc_id, "id": clause_id, **ANALYZED}, CACHE_PROJECTION)
+        if existing:
+            print(f"[DEBUG] Cache hit for {clause_id} from MongoDB")
+            return existing
+    except Exception as e:
+        print(f"[WARN] MongoDB unavailable → skipping cache check: {e}")
 
     # -----------------------------
-    # Step 3: Final result
+    # Near-duplicate of an analyzed clause → reuse its analysis
     # -----------------------------
-    result = {
-        "doc": filename,
-        "id": clause_id,
-        "original": text,
-        "explanation": explanation,
-        "risk": risk,
-        "model_used": model_used,
-    }
+    signature = minhash(text)
+    if SIMILARITY_THRESHOLD <= 1:
+        reused = reuse_similar_analysis(doc_id, clause_id, text, signature, collection)
+        if reused:
+            return reused
+
+    # -----------------------------
+    # Step 1: Ask Gemini for Explanation + Risk in all 3 languages
+    # -----------------------------
+    explanation_prompt, risk_prompt = build_prompts(text)
+    with admit():
+        explanation_json, model_used = call_gemini(explanation_prompt)
+        risk_json, risk_model = call_gemini(risk_prompt)
+
+    result = build_result(doc_id, clause_id, text, explanation_json, risk_json, model_used)
 
     # Save to Mongo if available
+    stored = stored_analysis(result, signature, risk_model)
+    if stored is not None:
+        try:
+            collection.update_one({"doc": doc_id, "id": clause_id}, {"$set": stored}, upsert=True)
+            clause_index.add(doc_id, clause_id, signature, text)
+            print(f"[DEBUG] Analyzed {clause_id} → saved to MongoDB with {model_used}")
+        except Exception as e:
+            print(f"[WARN] Could not save to MongoDB: {e}")
+
+    result.pop("doc", None)
+    return result
+
+
+def reuse_similar_analysis(doc_id, clause_id, text, signature, collection):
+    """
+    Return a stored analysis of a near-identical clause (flagged "reused"),
+    or None. The copy is saved under this doc/clause so the next request is
+    an exact cache hit; it is not indexed itself, so matches always point
+    at an originally analyzed clause.
+    """
+    clause_index.load(collection)
+    match = clause_index.lookup(signature, text, SIMILARITY_THRESHOLD, exclude=(doc_id, clause_id))
+    if match is None:
+        return None
     try:
-        current_app.clauses_collection.update_one(
-            {"doc": filename, "id": clause_id},
-            {"$set": result},
-            upsert=True,
-        )
-        print(f"[DEBUG] Analyzed {clause_id} → saved to MongoDB with {model_used}")
+        source = collection.find_one({"doc": match[0], "id": match[1], **ANALYZED}, CACHE_PROJECTION)
+    except Exception as e:
+        print(f"[WARN] MongoDB unavailable → skipping similarity reuse: {e}")
+        return None
+    if not source:
+        return None
+
+    result = build_reused_result(doc_id, clause_id, text, source, match)
+    try:
+        collection.update_one({"doc": doc_id, "id": clause_id}, {"$set": result}, upsert=True)
     except Exception as e:
         print(f"[WARN] Could not save to MongoDB: {e}")
+    print(f"[DEBUG] Reused analysis of {match[0]}/{match[1]} for {clause_id} (similarity {match[2]:.2f})")
 
     result.pop("doc", None)
-    return jsonify(result)
+    return result
+
+
+def schedule_prefetch(doc_id, clauses, collection):
+    """Queue background analyses for the given clauses of a freshly uploaded doc."""
+    for c in clauses:
+        clause_id, text = c["id"], c["original"]
+        scheduler.submit(
+            doc_id, clause_id,
+            lambda cid=clause_id, t=text: run_analysis(doc_id, cid, t, collection),
+            priority=PREFETCH,
+        )
+    if clauses:
+        print(f"[SCHED] Queued prefetch for {len(clauses)} clause(s) of {doc_id}")
+
+
+# -----------------------------
+# Main Route
+# -----------------------------
+@analyze_bp.route("/analyze_clause", methods=["POST"])
+def analyze_clause():
+    data = request.get_json(silent=True) or {}
+    print("[DEBUG] Incoming JSON:", data)
+
+    clause_id = data.get("clause_id")
+    text = data.get("text", "")
+    doc_id = (
+        current_app.doc_cache.get("doc_id")
+        if hasattr(current_app, "doc_cache")
+        else "unknown"
+    )
+
+    # -----------------------------
+    # Empty clause guard
+    # -----------------------------
+    if not text.strip():
+        return jsonify(empty_clause_result(clause_id, text)), 200
+
+    # -----------------------------
+    # Prefetch already running for this clause → wait for it
+    # -----------------------------
+    pending = scheduler.claim(doc_id, clause_id)
+    if pending is not None:
+        print(f"[DEBUG] Joining in-flight prefetch for {clause_id}")
+        try:
+            return jsonify(pending.result()), 200
+        except Exception as e:
+            print(f"[WARN] Prefetch for {clause_id} failed → analyzing inline: {e}")
+
+    try:
+        with scheduler.foreground():
+            result = run_analysis(
+                doc_id, clause_id, text, current_app.clauses_collection,
+                admit=lambda: admission.slot("analyze_clause"),
+            )
+    except Overloaded as e:
+        return overloaded_response(e)
+    return jsonify(result), 200
@@ -0,0 +1,186 @@
+# routes/route_async.py
+# Async twins of the LLM-bound endpoints, served from asgi.py.
+# Same URLs, request bodies and responses as the Flask blueprints; prompts,
+# result shapes, cache rules and chat replies are shared, only Gemini +
+# Mongo (motor) are awaited here.
+import asyncio
+from quart import Blueprint, request, jsonify, current_app
+
+from utils.similarity import minhash
+from utils.admission import Overloaded, overloaded_response
+from routes.route_analyze import (
+    scheduler, admission, clause_index, SIMILARITY_THRESHOLD, ANALYZED, CACHE_PROJECTION,
+    acall_gemini, build_prompts, build_result, build_reused_result, empty_clause_result,
+    stored_analysis,
+)
+from routes.route_chat import (
+    chat_admission, acall_gemini_chat, clause_chat_prompt, doc_chat_prompt,
+    chat_reply, chat_error, NO_QUESTION,
+)
+from routes.route_chat_global import build_global_prompt, joined_clause_text
+from routes.route_upload import summary_engine, summary_admission
+
+async_bp = Blueprint("async_llm", __name__)
+
+
+def doc_cache():
+    """Doc cache lives on the Flask app (upload/reset still run there)."""
+    return getattr(current_app.flask_app, "doc_cache", None) or {}
+
+
+# -----------------------------
+# Analysis
+# -----------------------------
+async def arun_analysis(doc_id, clause_id, text, collection):
+    """run_analysis() with motor + both Gemini calls in flight together."""
+    try:
+        existing = await collection.find_one({"doc": doc_id, "id": clause_id, **ANALYZED}, CACHE_PROJECTION)
+        if existing:
+            print(f"[DEBUG] Cache hit for {clause_id} from MongoDB")
+            return existing
+    except Exception as e:
+        print(f"[WARN] MongoDB unavailable → skipping cache check: {e}")
+
+    signature = minhash(text)
+    if SIMILARITY_THRESHOLD <= 1:
+        reused = await areuse_similar_analysis(doc_id, clause_id, text, signature, collection)
+        if reused:
+            return reused
+
+    explanation_prompt, risk_prompt = build_prompts(text)
+    async with admission.aslot("analyze_clause"):
+        (explanation_json, model_used), (risk_json, risk_model) = await asyncio.gather(
+            acall_gemini(explanation_prompt),
+            acall_gemini(risk_prompt),
+        )
+
+    result = build_result(doc_id, clause_id, text, explanation_json, risk_json, model_used)
+
+    stored = stored_analysis(result, signature, risk_model)
+    if stored is not None:
+        try:
+            await collection.update_one({"doc": doc_id, "id": clause_id}, {"$set": stored}, upsert=True)
+            clause_index.add(doc_id, clause_id, signature, text)
+            print(f"[DEBUG] Analyzed {clause_id} → saved to MongoDB with {model_used}")
+        except Exception as e:
+            print(f"[WARN] Could not save to MongoDB: {e}")
+
+    result.pop("doc", None)
+    return result
+
+
+async def areuse_similar_analysis(doc_id, clause_id, text, signature, collection):
+    """reuse_similar_analysis() with motor."""
+    await clause_index.aload(collection)
+    match = clause_index.lookup(signature, text, SIMILARITY_THRESHOLD, exclude=(doc_id, clause_id))
+    if match is None:
+        return None
+    try:
+        source = await collection.find_one({"doc": match[0], "id": match[1], **ANALYZED}, CACHE_PROJECTION)
+    except Exception as e:
+        print(f"[WARN] MongoDB unavailable → skipping similarity reuse: {e}")
+        return None
+    if not source:
+        return None
+
+    result = build_reused_result(doc_id, clause_id, text, source, match)
+    try:
+        await collection.update_one({"doc": doc_id, "id": clause_id}, {"$set": result}, upsert=True)
+    except Exception as e:
+        print(f"[WARN] Could not save to MongoDB: {e}")
+    print(f"[DEBUG] Reused analysis of {match[0]}/{match[1]} for {clause_id} (similarity {match[2]:.2f})")
+
+    result.pop("doc", None)
+    return result
+
+
+@async_bp.route("/analyze_clause", methods=["POST"])
+async def analyze_clause():
+    data = await request.get_json(silent=True) or {}
+    print("[DEBUG] Incoming JSON:", data)
+
+    clause_id = data.get("clause_id")
+    text = data.get("text", "")
+    doc_id = doc_cache().get("doc_id")
+
+    if not text.strip():
+        return jsonify(empty_clause_result(clause_id, text)), 200
+
+    pending = scheduler.claim(doc_id, clause_id)
+    if pending is not None:
+        print(f"[DEBUG] Joining in-flight prefetch for {clause_id}")
+        try:
+            return jsonify(await asyncio.wrap_future(pending)), 200
+        except Exception as e:
+            print(f"[WARN] Prefetch for {clause_id} failed → analyzing inline: {e}")
+
+    try:
+        with scheduler.foreground():
+            result = await arun_analysis(doc_id, clause_id, text, current_app.clauses_collection)
+    except Overloaded as e:
+        return overloaded_response(e)
+    return jsonify(result), 200
+
+
+# -----------------------------
+# Chat
+# -----------------------------
+@async_bp.route("/chat_clause", methods=["POST"])
+async def chat_clause():
+    prompt = clause_chat_prompt(await request.get_json(force=True), doc_cache())
+    if prompt is None:
+        return jsonify(NO_QUESTION), 200
+    try:
+        async with chat_admission.aslot("chat_clause"):
+            reply = await acall_gemini_chat(prompt)
+        return jsonify(chat_reply(reply, limit=500))
+    except Exception as e:
+        return chat_error("chat_clause", e)
+
+
+@async_bp.route("/chat_doc", methods=["POST"])
+async def chat_doc():
+    prompt = doc_chat_prompt(await request.get_json(force=True), doc_cache())
+    if prompt is None:
+        return jsonify(NO_QUESTION), 200
+    try:
+        async with chat_admission.aslot("chat_doc"):
+            reply = await acall_gemini_chat(prompt)
+        return jsonify(chat_reply(reply, limit=500))
+    except Exception as e:
+        return chat_error("chat_doc", e)
+
+
+@async_bp.route("/chat_global", methods=["POST"])
+async def chat_global():
+    data = await request.get_json(force=True)
+    user_message = data.get("message", "").strip()
+
+    cache = doc_cache()
+    doc_summary = cache.get("summary", "")
+    clauses = cache.get("clauses", [])
+
+    if not user_message:
+        return jsonify(NO_QUESTION), 200
+
+    if not doc_summary and clauses:
+        # fallback: summarize all clauses (chunk summaries are cached → cheap on repeat)
+        text = joined_clause_text(clauses)
+        try:
+            async with summary_admission.aslot("summarize", cost=summary_engine.max_calls(text)):
+                doc_summary, complete = await summary_engine.asummarize(text)
+        except Overloaded as e:
+            return overloaded_response(e)
+        except Exception as e:
+            print(f"[WARN] Summary generation failed: {e}")
+            doc_summary, complete = "", False
+        if complete:  # partial → use for this answer only, retry on the next question
+            cache["summary"] = doc_summary
+
+    prompt = build_global_prompt(user_message, doc_summary)
+    try:
+        async with chat_admission.aslot("chat_global"):
+            reply = await acall_gemini_chat(prompt)
+        return jsonify(chat_reply(reply))
+    except Exception as e:
+        return chat_error("chat_global", e)
@@ -1,44 +1,43 @@
 from flask import Blueprint, request, jsonify, current_app
-import google.generativeai as genai
-from key_manager import GeminiKeyManager
+from utils.gemini import generate, agenerate
+from key_manager import get_key_manager
+from routes.route_analyze import scheduler
+from utils.admission import get_admission_controller, Overloaded, overloaded_response
 
 chat_bp = Blueprint("chat", __name__)
-chat_keys = GeminiKeyManager("GEMINI_KEYS_CHAT")  # use rotating chat keys
+chat_keys = get_key_manager("GEMINI_KEYS_CHAT")  # use rotating chat keys
+chat_admission = get_admission_controller(chat_keys)
 
+NO_QUESTION = {"reply": "⚠️ No question provided."}
 
-def call_gemini_chat(prompt: str, force_index: int = None):
-    """Call Gemini with chat keys (rotating or fixed index)."""
-    api_key, idx, total, count = chat_keys.get_key(return_meta=True)
 
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    resp = model.generate_content(prompt)
-    if resp and resp.text:
-        return resp.text.strip()[:500]  # short friendly answers
-    return "⚠️ No reply."
+def call_gemini_chat(prompt: str):
+    """Ask Gemini with chat keys (rotating) → reply text or None."""
+    reply, _ = generate(chat_keys, prompt)
+    return reply
 
 
-# ---------------- Clause Chat ----------------
-@chat_bp.route("/chat_clause", methods=["POST"])
-def chat_clause():
-    """Chatbot that answers using the selected clause only (SCORGAL persona)."""
-    data = request.get_json(force=True)
-    user_message = data.get("message", "").strip()
-    clause_text = data.get("clause", "").strip()
+async def acall_gemini_chat(prompt: str):
+    """Async twin of call_gemini_chat for the ASGI path."""
+    reply, _ = await agenerate(chat_keys, prompt)
+    return reply
 
-    # fallback to first clause if none given
-    if not clause_text and hasattr(current_app, "doc_cache"):
-        clauses = current_app.doc_cache.get("clauses", [])
-        if clauses:
-            clause_text = clauses[0]["original"]
 
-    doc_summary = current_app.doc_cache.get("summary", "")
+def chat_reply(reply, limit: int = None):
+    """Response body for a chat answer; shared by every chat endpoint."""
+    return {"reply": (reply or "⚠️ No reply.")[:limit]}
 
-    if not user_message:
-        return jsonify({"reply": "⚠️ No question provided."}), 200
 
-    # 🦂🦅 SCORGAL identity
-    identity = """
+def chat_error(endpoint: str, e: Exception):
+    """(body, status) for a chat call that failed (busy key pool → 429)."""
+    if isinstance(e, Overloaded):
+        return overloaded_response(e)
+    print(f"[ERROR {endpoint}]:", e)
+    return {"reply": "⚠️ Failed to fetch answer."}, 500
+
+
+# 🦂🦅 SCORGAL identity
+IDENTITY = """
     You are **SCORGAL**, an AI Legal Assistant created by the Scorgal Group.
     Your name means: Sharp as an Eagle 🦅, Dangerous as a Scorpion 🦂.
     Your purpose is to simplify, explain, and analyze legal documents clearly.
@@ -47,6 +46,9 @@ def chat_clause():
     - Always speak as SCORGAL, not as Gemini or Google.
     """
 
+
+def build_clause_prompt(user_message, clause_text, doc_summary):
+    identity = IDENTITY
     prompt = f"""
     {identity}
 
@@ -63,44 +65,11 @@ def chat_clause():
     Document context:
     {doc_summary or "⚠️ No summary available"}
     """
+    return prompt
 
-    try:
-        reply = call_gemini_chat(prompt)
-        return jsonify({"reply": reply})
-    except Exception as e:
-        print("[ERROR chat_clause]:", e)
-        return jsonify({"reply": "⚠️ Failed to fetch answer."}), 500
-
-
-# ---------------- Document Chat ----------------
-@chat_bp.route("/chat_doc", methods=["POST"])
-def chat_doc():
-    """Chatbot that answers using full document context (SCORGAL persona)."""
-    data = request.get_json(force=True)
-    user_message = data.get("message", "").strip()
-
-    if not user_message:
-        return jsonify({"reply": "⚠️ No question provided."}), 200
-
-    summary = ""
-    clauses = []
-    if hasattr(current_app, "doc_cache"):
-        cache = current_app.doc_cache
-        clauses = cache.get("clauses", [])
-        summary = cache.get("summary", "")
-
-    joined_clauses = "\n".join([c["original"] for c in clauses]) if clauses else "⚠️ None"
-
-    # 🦂🦅 SCORGAL identity
-    identity = """
-    You are **SCORGAL**, an AI Legal Assistant created by the Scorgal Group.
-    Your name means: Sharp as an Eagle 🦅, Dangerous as a Scorpion 🦂.
-    Your purpose is to simplify, explain, and analyze legal documents clearly.
-    - Never say you are made by Google, OpenAI, or any outside company.
-    - If asked "who made you?", always reply: "I was created by the Scorgal Group."
-    - Always speak as SCORGAL, not as Gemini or Google.
-    """
 
+def build_doc_prompt(user_message, summary, joined_clauses):
+    identity = IDENTITY
     prompt = f"""
     {identity}
 
@@ -115,14 +84,72 @@ def chat_doc():
     Clauses:
     {joined_clauses[:3000]}  # avoid overload
     """
+    return prompt
+
+
+def doc_context(cache):
+    """(summary, clauses, joined clause text) from the doc cache."""
+    clauses = cache.get("clauses", []) if cache else []
+    summary = cache.get("summary", "") if cache else ""
+    joined_clauses = "\n".join([c["original"] for c in clauses]) if clauses else "⚠️ None"
+    return summary, clauses, joined_clauses
+
+
+def doc_cache():
+    return getattr(current_app, "doc_cache", None) or {}
+
+
+# ---------------- Clause Chat ----------------
+def clause_chat_prompt(data, cache):
+    """Prompt for a clause question, or None when no question was asked."""
+    user_message = data.get("message", "").strip()
+    clause_text = data.get("clause", "").strip()
+
+    # fallback to first clause if none given
+    if not clause_text and cache.get("clauses"):
+        clause_text = cache["clauses"][0]["original"]
+
+    if not user_message:
+        return None
+    return build_clause_prompt(user_message, clause_text, cache.get("summary", ""))
+
 
+@chat_bp.route("/chat_clause", methods=["POST"])
+def chat_clause():
+    """Chatbot that answers using the selected clause only (SCORGAL persona)."""
+    prompt = clause_chat_prompt(request.get_json(force=True), doc_cache())
+    if prompt is None:
+        return jsonify(NO_QUESTION), 200
+    try:
+        with chat_admission.slot("chat_clause"):
+            reply = call_gemini_chat(prompt)
+        return jsonify(chat_reply(reply, limit=500))  # short friendly answers
+    except Exception as e:
+        return chat_error("chat_clause", e)
+
+
+# ---------------- Document Chat ----------------
+def doc_chat_prompt(data, cache):
+    """Prompt for a whole-document question, or None when no question was asked."""
+    user_message = data.get("message", "").strip()
+    if not user_message:
+        return None
+    summary, clauses, joined_clauses = doc_context(cache)
+    return build_doc_prompt(user_message, summary, joined_clauses)
+
+
+@chat_bp.route("/chat_doc", methods=["POST"])
+def chat_doc():
+    """Chatbot that answers using full document context (SCORGAL persona)."""
+    prompt = doc_chat_prompt(request.get_json(force=True), doc_cache())
+    if prompt is None:
+        return jsonify(NO_QUESTION), 200
     try:
-        # 👇 use the 3rd Gemini key slot for doc-wide chat
-        reply = call_gemini_chat(prompt, force_index=2)
-        return jsonify({"reply": reply})
+        with chat_admission.slot("chat_doc"):
+            reply = call_gemini_chat(prompt)
+        return jsonify(chat_reply(reply, limit=500))
     except Exception as e:
-        print("[ERROR chat_doc]:", e)
-        return jsonify({"reply": "⚠️ Failed to fetch answer."}), 500
+        return chat_error("chat_doc", e)
 
 
 # ---------------- Reset Chat Context ----------------
@@ -132,6 +159,7 @@ def reset_chat():
     try:
         if hasattr(current_app, "doc_cache"):
             current_app.doc_cache = {}  # wipe it clean
+        scheduler.cancel_all()  # no point prefetching for a doc that's gone
         return jsonify({"status": "reset"}), 200
     except Exception as e:
         print("[ERROR reset_chat]:", e)
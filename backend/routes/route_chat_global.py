@@ -1,36 +1,13 @@
-from flask import Blueprint, request, jsonify, current_app
-import google.generativeai as genai
-from key_manager import GeminiKeyManager
+from flask import Blueprint, request, jsonify
+from routes.route_upload import generate_summary, summary_engine, summary_admission
+from utils.admission import Overloaded, overloaded_response
+from routes.route_chat import (  # same chat keys + admission
+    chat_admission, call_gemini_chat, chat_reply, chat_error, doc_cache, NO_QUESTION,
+)
 
 chat_global_bp = Blueprint("chat_global", __name__)
-chat_keys = GeminiKeyManager("GEMINI_KEYS_CHAT")  # reuse chat keys
-
-def call_gemini_chat(prompt: str):
-    """Call Gemini with chat keys (rotating if needed)."""
-    api_key, idx, total, count = chat_keys.get_key(return_meta=True)
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    resp = model.generate_content(prompt)
-    if resp and resp.text:
-        return resp.text.strip()
-    return "⚠️ No reply."
-
-@chat_global_bp.route("/chat_global", methods=["POST"])
-def chat_global():
-    data = request.get_json(force=True)
-    user_message = data.get("message", "").strip()
-
-    # Context → summary or all clauses
-    doc_summary = current_app.doc_cache.get("summary", "")
-    clauses = current_app.doc_cache.get("clauses", [])
-
-    if not doc_summary and clauses:
-        # fallback: join first few clauses (limit length)
-        doc_summary = " ".join([c.get("original", "") for c in clauses[:5]])[:1500]
-
-    if not user_message:
-        return jsonify({"reply": "⚠️ No question provided."}), 200
 
+def build_global_prompt(user_message, doc_summary):
     prompt = f"""
     You are SCORGAL, a friendly legal assistant. 
     The user asked: {user_message}
@@ -40,10 +17,43 @@ def chat_global():
 
     Answer simply and clearly, with real-world examples if useful.
     """
+    return prompt
+
+def joined_clause_text(clauses):
+    return "\n".join([c.get("original", "") for c in clauses])
 
+
+@chat_global_bp.route("/chat_global", methods=["POST"])
+def chat_global():
+    data = request.get_json(force=True)
+    user_message = data.get("message", "").strip()
+
+    # Context → summary or all clauses
+    cache = doc_cache()
+    doc_summary = cache.get("summary", "")
+    clauses = cache.get("clauses", [])
+
+    if not user_message:
+        return jsonify(NO_QUESTION), 200
+
+    if not doc_summary and clauses:
+        # fallback: summarize all clauses (chunk summaries are cached → cheap on repeat)
+        text = joined_clause_text(clauses)
+        try:
+            with summary_admission.slot("summarize", cost=summary_engine.max_calls(text)):
+                doc_summary, complete = generate_summary(text)
+        except Overloaded as e:
+            return overloaded_response(e)  # no room for a whole map-reduce right now
+        except Exception as e:
+            print(f"[WARN] Summary generation failed: {e}")
+            doc_summary, complete = "", False
+        if complete:  # partial → use for this answer only, retry on the next question
+            cache["summary"] = doc_summary
+
+    prompt = build_global_prompt(user_message, doc_summary)
     try:
-        reply = call_gemini_chat(prompt)
-        return jsonify({"reply": reply})
+        with chat_admission.slot("chat_global"):
+            reply = call_gemini_chat(prompt)
+        return jsonify(chat_reply(reply))
     except Exception as e:
-        print("[ERROR chat_global]:", e)
-        return jsonify({"reply": "⚠️ Failed to fetch answer."}), 500
+        return chat_error("chat_global", e)
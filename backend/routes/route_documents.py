@@ -0,0 +1,96 @@
+# routes/route_documents.py
+import base64, hashlib, json
+from flask import Blueprint, request, jsonify, current_app
+
+documents_bp = Blueprint("documents", __name__)
+
+# ------------------ Config ------------------
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+INDEX_FIELDS = {"id", "label", "offset", "length"}
+TEXT_FIELDS = {"original"}
+ANALYSIS_FIELDS = {"explanation", "risk", "model_used", "reused", "reused_from"}
+DEFAULT_FIELDS = ["id", "label", "offset", "length"]
+
+# ------------------ Helpers ------------------
+
+def encode_cursor(doc_id: str, position: int) -> str:
+    raw = f"{doc_id}:{position}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, doc_id: str) -> int:
+    """Position encoded in cursor (ValueError if malformed or for another doc)."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    cursor_doc, position = base64.urlsafe_b64decode(padded).decode("utf-8").rsplit(":", 1)
+    if cursor_doc != doc_id:
+        raise ValueError("cursor belongs to another document")
+    if int(position) < 0:
+        raise ValueError("negative cursor position")
+    return int(position)
+
+def load_analyses(doc_id, clause_ids, fields):
+    """Cached analyses for this page of clauses, keyed by clause id (Gemini fallback rows skipped)."""
+    projection = {"_id": 0, "id": 1, **{f: 1 for f in fields}}
+    try:
+        rows = current_app.clauses_collection.find(
+            {"doc": doc_id, "id": {"$in": clause_ids}, "model_used": {"$ne": "None"}}, projection
+        )
+        return {r["id"]: r for r in rows}
+    except Exception as e:
+        print(f"[WARN] MongoDB unavailable → listing without analyses: {e}")
+        return {}
+
+# ------------------ Routes ------------------
+
+@documents_bp.route("/documents/<doc_id>/clauses", methods=["GET"])
+def list_clauses(doc_id):
+    """
+    Page through the current document's clauses.
+    ?cursor=<next_cursor>&limit=50&fields=id,label,original,explanation,risk
+    Analyses already in Mongo are merged in (null when not analyzed yet).
+    """
+    cache = getattr(current_app, "doc_cache", None) or {}
+    if cache.get("doc_id") != doc_id:
+        return jsonify({"error": "Unknown document"}), 404
+
+    fields = [f.strip() for f in request.args.get("fields", ",".join(DEFAULT_FIELDS)).split(",") if f.strip()]
+    unknown = set(fields) - INDEX_FIELDS - TEXT_FIELDS - ANALYSIS_FIELDS
+    if unknown:
+        return jsonify({"error": f"Unknown field(s): {', '.join(sorted(unknown))}"}), 400
+
+    try:
+        limit = min(max(int(request.args.get("limit", DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        start = decode_cursor(request.args["cursor"], doc_id) if request.args.get("cursor") else 0
+    except (ValueError, UnicodeDecodeError):
+        return jsonify({"error": "Invalid cursor or limit"}), 400
+
+    index = cache.get("index", [])
+    page = index[start:start + limit]
+    originals = {c["id"]: c["original"] for c in cache.get("clauses", [])[start:start + limit]}
+
+    wanted_analysis = [f for f in fields if f in ANALYSIS_FIELDS]
+    analyses = load_analyses(doc_id, [c["id"] for c in page], wanted_analysis) if wanted_analysis else {}
+
+    items = []
+    for entry in page:
+        item = {f: entry[f] for f in fields if f in INDEX_FIELDS}
+        if "original" in fields:
+            item["original"] = originals.get(entry["id"])
+        for f in wanted_analysis:
+            item[f] = analyses.get(entry["id"], {}).get(f)
+        items.append(item)
+
+    end = start + len(page)
+    body = {
+        "doc_id": doc_id,
+        "total": len(index),
+        "clauses": items,
+        "next_cursor": encode_cursor(doc_id, end) if end < len(index) else None,
+    }
+
+    # ETag over the page content → unchanged pages (incl. analyses) revalidate as 304
+    etag = hashlib.sha1(json.dumps(body, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    resp = jsonify(body)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
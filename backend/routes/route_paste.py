@@ -1,23 +1,29 @@
 # routes/route_paste.py
 from flask import Blueprint, request, jsonify, current_app
-from routes.route_upload import split_into_clauses, clean_text
+from routes.route_upload import evict_current_doc
+from utils.file_parser import split_into_clauses, clean_text
 from PIL import Image
-import pytesseract, base64
+import pytesseract, base64, hashlib
 import io
 
 paste_bp = Blueprint("paste", __name__)
 
+def doc_id_for(text: str) -> str:
+    """Content hash → analyses of the same pasted text are shared (like uploads)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
 @paste_bp.route("/paste", methods=["POST"])
 def paste_input():
     data = request.json
     text = data.get("text", "").strip()
     image_b64 = data.get("image", None)
+    evict_current_doc()
 
     if text:
         # Clean + split pasted text
         text = clean_text(text)
         clauses = split_into_clauses(text)
-        current_app.doc_cache = {"filename": "pasted_text", "clauses": clauses}
+        current_app.doc_cache = {"filename": "pasted_text", "doc_id": doc_id_for(text), "clauses": clauses}
         return jsonify({"doc_type": "Pasted Text", "clauses": clauses})
 
     elif image_b64:
@@ -31,7 +37,9 @@ def paste_input():
             extracted = clean_text(extracted)
             clauses = split_into_clauses(extracted)
 
-            current_app.doc_cache = {"filename": "pasted_image", "clauses": clauses}
+            current_app.doc_cache = {
+                "filename": "pasted_image", "doc_id": doc_id_for(extracted), "clauses": clauses
+            }
             return jsonify({"doc_type": "Pasted Image", "clauses": clauses})
         except Exception as e:
             return jsonify({"error": f"OCR failed: {e}"}), 500
@@ -1,4 +1,4 @@
-import os, re, io
+import os, io, tempfile
 import pdfplumber
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
@@ -7,168 +7,131 @@ from docx import Document
 from PIL import Image
 
 # ✅ Gemini
-import google.generativeai as genai
-from key_manager import GeminiKeyManager
+from utils.gemini import generate
+from key_manager import get_key_manager
+from utils.summarizer import SummaryEngine
+from utils.admission import get_admission_controller
+from utils.upload_store import UploadStore
+from utils.file_parser import clean_text, split_into_clauses
+from routes.route_analyze import scheduler, schedule_prefetch
 
 # ------------------ Config ------------------
 UPLOAD_FOLDER = os.path.join(os.getcwd(), "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# cap for the whole uploads/blobs dir, shared by all worker processes (each sweep re-reads usage from disk)
+UPLOAD_STORE_MAX_BYTES = int(os.getenv("UPLOAD_STORE_MAX_MB", "512")) * (1 << 20)
+SUPPORTED_TYPES = (".pdf", ".docx", ".png", ".jpg", ".jpeg")
 
-MAX_CLAUSE_LENGTH = 1000
-MIN_CLAUSE_LENGTH = 40
+PREFETCH_FIRST_N = 5    # clauses analyzed speculatively right after upload
+PREFETCH_MAX = 15       # total cap (head + risky) → prefetch never drains the key pool
+RISK_KEYWORDS = [
+    "indemnif", "terminat", "penalt", "liabilit", "forfeit", "waive",
+    "arbitration", "non-compete", "exclusiv", "liquidated damages", "breach",
+]
 
 upload_bp = Blueprint("upload", __name__)
 
 # Different key managers
-summ_keys = GeminiKeyManager("GEMINI_KEYS")        # summaries + analysis
-ocr_keys = GeminiKeyManager("GEMINI_KEYS_OCR")     # OCR dedicated pool
+summ_keys = get_key_manager("GEMINI_KEYS")         # summaries + analysis
+ocr_keys = get_key_manager("GEMINI_KEYS_OCR")      # OCR dedicated pool
+
+# Map-reduce summarizer over the full text (chunk summaries cached by content)
+summary_engine = SummaryEngine(summ_keys)
+# chat_global's summary fallback waits for (or is refused) capacity on the same pool
+summary_admission = get_admission_controller(summ_keys)
+
+# Uploads stored by content hash (deduped, size-bounded LRU)
+upload_store = UploadStore(UPLOAD_FOLDER, UPLOAD_STORE_MAX_BYTES)
 
 # ------------------ Helpers ------------------
 
-def clean_text(text: str) -> str:
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'-\s+', '', text)
-    text = re.sub(r'Illustration.*LegalDesk.*', '', text, flags=re.I)
-    return text.strip()
-
-def is_valid_clause(t: str) -> bool:
-    t = t.strip()
-    if len(t) < MIN_CLAUSE_LENGTH:
-        return False
-    if re.fullmatch(r'[\d\W]+', t):
-        return False
-    keywords = ["shall", "means", "agreement", "party", "term", "license"]
-    if not any(k in t.lower() for k in keywords):
-        return False
-    return True
-
-def split_into_clauses(text: str):
-    text = re.sub(r'^\s*\d+\s*$', '', text, flags=re.M)
-    raw_chunks = re.split(r'(?=\n?\d+\.\s)', text)
-
-    results = []
-    counter = 1
-    for chunk in raw_chunks:
-        chunk = chunk.strip()
-        if not chunk:
-            continue
-
-        if len(chunk) > MAX_CLAUSE_LENGTH and "means" in chunk.lower():
-            subs = re.split(r'(?=(["“][^"”]+["”]\s+means))', chunk)
-            clean_subs = []
-            for sub in subs:
-                sub = sub.strip()
-                if not sub:
-                    continue
-                if len(sub) > 500:
-                    sentences = re.split(r'(?<=[.;])\s+', sub)
-                    buffer = ""
-                    for s in sentences:
-                        if len(buffer) + len(s) < 400:
-                            buffer += " " + s
-                        else:
-                            if buffer.strip():
-                                clean_subs.append(buffer.strip())
-                            buffer = s
-                    if buffer.strip():
-                        clean_subs.append(buffer.strip())
-                else:
-                    clean_subs.append(sub)
-
-            for j, sub in enumerate(clean_subs, 1):
-                if is_valid_clause(sub):
-                    results.append({
-                        "id": f"clause_{counter}{chr(96+j)}",
-                        "label": sub[:80],
-                        "original": sub,
-                        "explanation": "Explanation pending...",
-                        "risk": "Risk pending..."
-                    })
-            counter += 1
-        else:
-            if is_valid_clause(chunk):
-                results.append({
-                    "id": f"clause_{counter}",
-                    "label": chunk.splitlines()[0][:80],
-                    "original": chunk,
-                    "explanation": "Explanation pending...",
-                    "risk": "Risk pending..."
-                })
-            counter += 1
-
-    print(f"[UPLOAD] Final clauses generated: {len(results)}")
-
-    if len(results) == 0:
-        print("[WARN] No valid clauses found → falling back to paragraphs")
-        paras = [p.strip() for p in text.split("\n") if len(p.strip()) > 20]
-        para_counter = 1
-        for p in paras:
-            chunks = [p[i:i+400] for i in range(0, len(p), 400)] if len(p) > 400 else [p]
-            for chunk in chunks:
-                results.append({
-                    "id": f"para_{para_counter}",
-                    "label": chunk[:80],
-                    "original": chunk,
-                    "explanation": "Explanation pending...",
-                    "risk": "Risk pending..."
-                })
-                para_counter += 1
-        print(f"[UPLOAD] Paragraph fallback → {len(results)} items")
-
-    return results
+def risk_score(t: str) -> int:
+    """Number of distinct risk keywords in the clause (0 → not risky)."""
+    t = t.lower()
+    return sum(1 for k in RISK_KEYWORDS if k in t)
+
+def select_prefetch_clauses(clauses):
+    """
+    First PREFETCH_FIRST_N clauses, then the riskiest of the rest
+    (most risk keywords first, document order on ties), PREFETCH_MAX in total.
+    """
+    head = clauses[:PREFETCH_FIRST_N]
+    scored = [(risk_score(c["original"]), i, c) for i, c in enumerate(clauses[PREFETCH_FIRST_N:])]
+    risky = sorted((s for s in scored if s[0] > 0), key=lambda s: (-s[0], s[1]))
+    return head + [c for _, _, c in risky[:max(0, PREFETCH_MAX - len(head))]]
+
+def evict_current_doc():
+    """Drop queued prefetch for the doc currently held in doc_cache."""
+    old = getattr(current_app, "doc_cache", None) or {}
+    if old.get("doc_id"):
+        scheduler.cancel_group(old["doc_id"])
+
+def index_clauses(text: str, clauses):
+    """Compact listing: id, label + char offset/length in the cleaned text (None if not verbatim)."""
+    index, cursor = [], 0
+    for c in clauses:
+        pos = text.find(c["original"], cursor)
+        if pos == -1:
+            pos = text.find(c["original"])
+        if pos != -1:
+            cursor = pos + len(c["original"])
+        index.append({
+            "id": c["id"],
+            "label": c["label"],
+            "offset": pos if pos != -1 else None,
+            "length": len(c["original"]),
+        })
+    return index
+
+def upload_response(doc_type, doc_id, clauses, index, summary):
+    """Full clause list by default; ?view=index → ids/labels/offsets only (page via /documents)."""
+    if request.args.get("view") == "index":
+        return jsonify({
+            "doc_type": doc_type,
+            "doc_id": doc_id,
+            "summary": summary,
+            "clause_count": len(index),
+            "clauses": index,
+        })
+    return jsonify({"doc_type": doc_type, "doc_id": doc_id, "clauses": clauses, "summary": summary})
 
 def gemini_ocr(image_path: str) -> str:
     """Extract text from scanned images or PDFs using Gemini Vision API (OCR keys)."""
     try:
-        api_key = ocr_keys.get_key()  # ✅ use OCR pool
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel("gemini-1.5-flash")
-
         with open(image_path, "rb") as f:
             image_bytes = f.read()
 
-        response = model.generate_content([
+        text, _ = generate(ocr_keys, [  # ✅ OCR pool, rotates on quota / invalid key
             {"mime_type": "image/png", "data": image_bytes},
             "Extract all readable text from this legal/official document image."
         ])
 
-        if response and response.text:
-            print(f"[OCR] Gemini extracted {len(response.text)} chars")
-            return clean_text(response.text)
+        if text:
+            print(f"[OCR] Gemini extracted {len(text)} chars")
+            return clean_text(text)
 
     except Exception as e:
         print(f"[ERROR] Gemini OCR failed: {e}")
     return ""
 
-def generate_summary(text: str) -> str:
-    """Use Gemini to generate a short summary of the doc."""
+def generate_summary(text: str):
+    """
+    Use Gemini to generate a short summary of the whole doc (map-reduce over chunks).
+    Returns (summary, complete) → only a complete summary should be cached as the doc's.
+    """
     try:
-        api_key = summ_keys.get_key()
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        resp = model.generate_content(f"Summarize this legal/official document in 5 concise lines:\n{text[:4000]}")
-        if resp and resp.text:
-            return resp.text.strip()
+        return summary_engine.summarize(text)
     except Exception as e:
         print(f"[WARN] Summary generation failed: {e}")
-    return "⚠️ Summary not available."
-
-# ------------------ Routes ------------------
-
-@upload_bp.route("/upload", methods=["POST"])
-def upload_file():
-    file = request.files["file"]
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(filepath)
-
-    print(f"[UPLOAD] Received file: {filename}, size={os.path.getsize(filepath)} bytes")
+    return "⚠️ Summary not available.", False
 
+def extract_text(filename: str, digest: str) -> str:
+    """Pull raw text out of a stored upload (parsers read the blob in place)."""
     text = ""
 
     if filename.lower().endswith(".pdf"):
         try:
-            with pdfplumber.open(filepath) as pdf:
+            with upload_store.open(digest) as f, pdfplumber.open(f) as pdf:
                 for page in pdf.pages:
                     text += page.extract_text() or ""
             print(f"[UPLOAD] PDF (plumber) extracted {len(text)} chars")
@@ -180,26 +143,56 @@ def upload_file():
             print("[WARN] pdfplumber found no text → using Gemini OCR fallback")
             try:
                 POPPLER_PATH = r"C:\Users\RUTUJA\Downloads\Release-25.07.0-0\poppler-25.07.0\Library\bin"
-                images = convert_from_path(filepath, poppler_path=POPPLER_PATH)
-                for img in images:
-                    img_path = os.path.join(UPLOAD_FOLDER, "temp_page.png")
-                    img.save(img_path, "PNG")
-                    text += gemini_ocr(img_path)
+                with upload_store.pinned(digest) as filepath, tempfile.TemporaryDirectory() as tmp:
+                    images = convert_from_path(filepath, poppler_path=POPPLER_PATH)
+                    for i, img in enumerate(images):
+                        img_path = os.path.join(tmp, f"page_{i}.png")
+                        img.save(img_path, "PNG")
+                        text += gemini_ocr(img_path)
                 print(f"[UPLOAD] Gemini OCR extracted {len(text)} chars")
             except Exception as e:
                 print(f"[ERROR] Gemini OCR fallback failed: {e}")
 
     elif filename.lower().endswith(".docx"):
-        doc = Document(filepath)
+        with upload_store.open(digest) as f:
+            doc = Document(f)
         text = "\n".join([p.text for p in doc.paragraphs])
 
     elif filename.lower().endswith((".png", ".jpg", ".jpeg")):
-        text = gemini_ocr(filepath)
+        with upload_store.pinned(digest) as filepath:
+            text = gemini_ocr(filepath)
 
-    else:
-        return jsonify({"error": "Unsupported file type"}), 400
+    return text
 
-    text = clean_text(text)
+# ------------------ Routes ------------------
+
+def too_large_body():
+    limit = UPLOAD_STORE_MAX_BYTES // (1 << 20)
+    return {"error": f"File too large (max {limit} MB)"}
+
+@upload_bp.errorhandler(413)
+def upload_too_large(e):
+    """
+    Body over MAX_CONTENT_LENGTH (= store cap) under plain WSGI: werkzeug
+    refuses it from Content-Length before parsing. Under asgi.py the same
+    check runs in application() instead, before asgiref spools the body.
+    """
+    return jsonify(too_large_body()), 413
+
+@upload_bp.route("/upload", methods=["POST"])
+def upload_file():
+    file = request.files["file"]
+    filename = secure_filename(file.filename)
+    if not filename.lower().endswith(SUPPORTED_TYPES):
+        return jsonify({"error": "Unsupported file type"}), 400
+    evict_current_doc()
+
+    # body was already streamed to disk + hashed while parsing → just commit it
+    # (pinned until the text is out, so eviction can't remove it mid-parse)
+    with upload_store.save(file.stream) as blob:
+        print(f"[UPLOAD] Received file: {filename}, size={blob.size} bytes, "
+              f"blob={blob.digest[:12]}{' (deduplicated)' if blob.deduped else ''}")
+        text = clean_text(extract_text(filename, blob.digest))
     print(f"[UPLOAD] Extracted raw text length: {len(text)} chars")
 
     if not text.strip():
@@ -211,13 +204,26 @@ def upload_file():
             "explanation": "Explanation pending...",
             "risk": "Risk pending..."
         }]
-        current_app.doc_cache = {"filename": filename, "clauses": clauses, "summary": ""}
-        return jsonify({"doc_type": "Image", "clauses": clauses, "summary": ""})
+        doc_id = blob.digest[:16]
+        index = index_clauses(text, clauses)
+        current_app.doc_cache = {
+            "filename": filename, "doc_id": doc_id, "clauses": clauses, "index": index, "summary": ""
+        }
+        return upload_response("Image", doc_id, clauses, index, "")
 
     clauses = split_into_clauses(text)
 
-    # ✅ generate summary
-    summary = generate_summary(text)
+    # ✅ generate summary (a partial one is shown but not cached → chat retries it later)
+    summary, complete = generate_summary(text)
+
+    doc_id = blob.digest[:16]
+    index = index_clauses(text, clauses)
+    current_app.doc_cache = {
+        "filename": filename, "doc_id": doc_id, "clauses": clauses, "index": index,
+        "summary": summary if complete else "",
+    }
+
+    # ✅ start analyzing likely-clicked clauses while the user reads the list
+    schedule_prefetch(doc_id, select_prefetch_clauses(clauses), current_app.clauses_collection)
 
-    current_app.doc_cache = {"filename": filename, "clauses": clauses, "summary": summary}
-    return jsonify({"doc_type": "Contract", "clauses": clauses, "summary": summary})
+    return upload_response("Contract", doc_id, clauses, index, summary)
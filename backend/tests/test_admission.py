@@ -0,0 +1,85 @@
+# tests/test_admission.py
+# Run from backend/: python -m pytest tests
+import asyncio
+import pytest
+
+from utils import admission
+from utils.admission import AdmissionController, Overloaded
+
+
+class FakePool:
+    """Stands in for GeminiKeyManager: capacity is set by the test."""
+
+    env_var = "TEST_KEYS"
+
+    def __init__(self, spare=0):
+        self.spare = spare
+
+    def spare_capacity(self):
+        return self.spare
+
+    def seconds_until_available(self, calls):
+        return 1
+
+
+@pytest.fixture(autouse=True)
+def fast_poll(monkeypatch):
+    monkeypatch.setattr(admission, "POLL_INTERVAL", 0.01)
+
+
+def test_cancelled_async_waiter_leaves_queue():
+    pool = FakePool(spare=0)
+    controller = AdmissionController(pool, max_wait=5)
+
+    async def scenario():
+        async def queued():
+            async with controller.aslot("chat_doc"):
+                pass
+
+        task = asyncio.create_task(queued())
+        await asyncio.sleep(0.05)
+        assert len(controller.waiters) == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert controller.waiters == []
+
+        pool.spare = 1
+        async with controller.aslot("chat_doc"):
+            assert controller.reserved == 1
+        assert controller.reserved == 0
+
+    asyncio.run(scenario())
+
+
+def test_interrupted_sync_waiter_leaves_queue(monkeypatch):
+    pool = FakePool(spare=0)
+    controller = AdmissionController(pool, max_wait=5)
+
+    def interrupted(_):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(admission.time, "sleep", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        with controller.slot("chat_doc"):
+            pass
+    assert controller.waiters == []
+
+    pool.spare = 1
+    with controller.slot("chat_doc"):
+        assert controller.reserved == 1
+    assert controller.reserved == 0
+
+
+def test_timed_out_waiter_does_not_block_next_request():
+    pool = FakePool(spare=0)
+    controller = AdmissionController(pool, max_wait=0.05)
+
+    with pytest.raises(Overloaded):
+        with controller.slot("chat_doc"):
+            pass
+    assert controller.waiters == []
+
+    pool.spare = 1
+    with controller.slot("chat_doc"):
+        pass
@@ -0,0 +1,47 @@
+# tests/test_key_manager.py
+# Run from backend/: python -m pytest tests
+import time
+
+from key_manager import GeminiKeyManager, CALLS_PER_MINUTE
+from utils.gemini import rotate_on_error, retry_hint
+
+
+def make_pool(monkeypatch, keys="k1,k2"):
+    monkeypatch.setenv("TEST_KEYS", keys)
+    return GeminiKeyManager("TEST_KEYS")
+
+
+def test_quota_error_takes_key_out_of_capacity(monkeypatch):
+    pool = make_pool(monkeypatch)
+    assert pool.spare_capacity() == 2 * CALLS_PER_MINUTE
+
+    error = Exception("429 Resource has been exhausted (e.g. check quota). Please retry in 20.5s.")
+    assert rotate_on_error(pool, error, "k1", 1)
+
+    assert pool.spare_capacity() == CALLS_PER_MINUTE
+    assert pool.get_key() == "k2"
+    assert 19 < pool.seconds_until_available(CALLS_PER_MINUTE + 1) <= 20.5
+
+
+def test_cooldown_ends(monkeypatch):
+    pool = make_pool(monkeypatch)
+    pool.mark_exhausted("k1", retry_after=0.01)
+    pool.mark_exhausted("k2", retry_after=0.01)
+    assert pool.spare_capacity() == 0
+
+    time.sleep(0.02)
+    assert pool.spare_capacity() == 2 * CALLS_PER_MINUTE
+
+
+def test_retry_hint():
+    assert retry_hint(Exception("retry_delay {\n  seconds: 37\n}")) == 37
+    assert retry_hint(Exception("429 quota exceeded")) is None
+
+
+def test_least_used_key_spreads_calls(monkeypatch):
+    pool = make_pool(monkeypatch, keys="k1,k2,k3")
+    picks = [pool.least_used_key() for _ in range(6)]
+    assert sorted(picks) == ["k1", "k1", "k2", "k2", "k3", "k3"]
+
+    pool.mark_exhausted("k1")
+    assert {pool.least_used_key() for _ in range(4)} == {"k2", "k3"}
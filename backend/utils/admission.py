@@ -0,0 +1,169 @@
+# utils/admission.py
+import os, math, time, heapq, itertools, threading, asyncio
+from contextlib import contextmanager, asynccontextmanager
+
+# ------------------ Config ------------------
+MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))       # waiting requests per key pool
+MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "15"))       # seconds before giving up → 429
+POLL_INTERVAL = 0.2
+
+# endpoint → (priority, Gemini calls it makes); lower priority number goes first
+ENDPOINTS = {
+    "analyze_clause": (0, 2),
+    "chat_clause": (1, 1),
+    "chat_doc": (1, 1),
+    "chat_global": (2, 1),
+    "summarize": (2, 1),  # map-reduce; callers pass the real call count as cost
+}
+
+
+class Overloaded(Exception):
+    """Raised when a request can't be admitted; carries a Retry-After hint."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Gemini key pool busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def overloaded_response(e: Overloaded):
+    """(body, 429, headers) — a plain dict body works for Flask and Quart alike."""
+    return (
+        {"error": "⚠️ Server busy, please retry shortly.", "retry_after": e.retry_after},
+        429,
+        {"Retry-After": str(e.retry_after)},
+    )
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "cost")
+
+    def __init__(self, priority, seq, cost):
+        self.priority = priority
+        self.seq = seq
+        self.cost = cost
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """
+    Admission control in front of one Gemini key pool.
+    - capacity = calls left in the pool's minute window − calls reserved by
+      requests already admitted
+    - requests that don't fit wait in a bounded queue ordered by endpoint
+      priority, then arrival
+    - a full queue or a wait longer than MAX_WAIT → Overloaded (HTTP 429)
+    """
+
+    def __init__(self, key_manager, max_queue: int = MAX_QUEUE, max_wait: float = MAX_WAIT):
+        self.key_manager = key_manager
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.waiters = []
+        self.reserved = 0
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+
+    def _retry_after(self, cost) -> int:
+        wait = self.key_manager.seconds_until_available(cost + self.reserved)
+        return max(1, math.ceil(wait))
+
+    def _enqueue(self, endpoint, priority, cost):
+        """Reserve right away (→ None) or return the queued waiter."""
+        with self.lock:
+            if not self.waiters and self.key_manager.spare_capacity() - self.reserved >= cost:
+                self.reserved += cost
+                return None
+            if len(self.waiters) >= self.max_queue:
+                print(f"[ADMIT] Queue full ({self.key_manager.env_var}) → rejecting {endpoint}")
+                raise Overloaded(self._retry_after(cost))
+            waiter = _Waiter(priority, next(self.seq), cost)
+            heapq.heappush(self.waiters, waiter)
+            return waiter
+
+    def _poll(self, waiter) -> bool:
+        with self.lock:
+            if self.waiters[0] is waiter and self.key_manager.spare_capacity() - self.reserved >= waiter.cost:
+                heapq.heappop(self.waiters)
+                self.reserved += waiter.cost
+                return True
+            return False
+
+    def _withdraw(self, waiter):
+        """Take a waiter that gave up (timeout, cancelled, client gone) out of the queue."""
+        with self.lock:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+                heapq.heapify(self.waiters)
+
+    def _abandon(self, waiter, endpoint):
+        self._withdraw(waiter)
+        with self.lock:
+            retry_after = self._retry_after(waiter.cost)
+        print(f"[ADMIT] Waited {self.max_wait:.0f}s for {endpoint} → rejecting")
+        raise Overloaded(retry_after)
+
+    def _release(self, cost):
+        with self.lock:
+            self.reserved -= cost
+
+    @contextmanager
+    def slot(self, endpoint, cost: int = None):
+        """
+        Hold a share of the key pool for the duration of the block
+        (`cost` overrides the endpoint's usual number of Gemini calls).
+        """
+        priority, usual_cost = ENDPOINTS.get(endpoint, (1, 1))
+        cost = usual_cost if cost is None else cost
+        waiter = self._enqueue(endpoint, priority, cost)
+        if waiter is not None:
+            try:
+                deadline = time.time() + self.max_wait
+                while not self._poll(waiter):
+                    if time.time() > deadline:
+                        self._abandon(waiter, endpoint)
+                    time.sleep(POLL_INTERVAL)
+            except BaseException:
+                # a waiter left at the head would block the queue for good
+                self._withdraw(waiter)
+                raise
+        try:
+            yield
+        finally:
+            self._release(cost)
+
+    @asynccontextmanager
+    async def aslot(self, endpoint, cost: int = None):
+        """slot() for the ASGI path — queues without blocking the event loop."""
+        priority, usual_cost = ENDPOINTS.get(endpoint, (1, 1))
+        cost = usual_cost if cost is None else cost
+        waiter = self._enqueue(endpoint, priority, cost)
+        if waiter is not None:
+            try:
+                deadline = time.time() + self.max_wait
+                while not self._poll(waiter):
+                    if time.time() > deadline:
+                        self._abandon(waiter, endpoint)
+                    await asyncio.sleep(POLL_INTERVAL)
+            except BaseException:
+                # a waiter left at the head would block the queue for good
+                self._withdraw(waiter)
+                raise
+        try:
+            yield
+        finally:
+            self._release(cost)
+
+
+# -----------------------------
+# Shared controllers (one per key pool, per process)
+# -----------------------------
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+def get_admission_controller(key_manager) -> AdmissionController:
+    with _controllers_lock:
+        if key_manager.env_var not in _controllers:
+            _controllers[key_manager.env_var] = AdmissionController(key_manager)
+        return _controllers[key_manager.env_var]
@@ -1,5 +1,8 @@
 import re
 
+MAX_CLAUSE_LENGTH = 1000
+MIN_CLAUSE_LENGTH = 40
+
 def find_contract_start(text: str) -> str:
     """
     Detect where the actual contract starts.
@@ -30,3 +33,97 @@ def find_contract_start(text: str) -> str:
             contract_lines.append(line)
 
     return "\n".join(contract_lines)
+
+
+def clean_text(text: str) -> str:
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'-\s+', '', text)
+    text = re.sub(r'Illustration.*LegalDesk.*', '', text, flags=re.I)
+    return text.strip()
+
+def is_valid_clause(t: str) -> bool:
+    t = t.strip()
+    if len(t) < MIN_CLAUSE_LENGTH:
+        return False
+    if re.fullmatch(r'[\d\W]+', t):
+        return False
+    keywords = ["shall", "means", "agreement", "party", "term", "license"]
+    if not any(k in t.lower() for k in keywords):
+        return False
+    return True
+
+
+def split_into_clauses(text: str):
+    text = re.sub(r'^\s*\d+\s*$', '', text, flags=re.M)
+    raw_chunks = re.split(r'(?=\n?\d+\.\s)', text)
+
+    results = []
+    counter = 1
+    for chunk in raw_chunks:
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+
+        if len(chunk) > MAX_CLAUSE_LENGTH and "means" in chunk.lower():
+            subs = re.split(r'(?=(["“][^"”]+["”]\s+means))', chunk)
+            clean_subs = []
+            for sub in subs:
+                sub = sub.strip()
+                if not sub:
+                    continue
+                if len(sub) > 500:
+                    sentences = re.split(r'(?<=[.;])\s+', sub)
+                    buffer = ""
+                    for s in sentences:
+                        if len(buffer) + len(s) < 400:
+                            buffer += " " + s
+                        else:
+                            if buffer.strip():
+                                clean_subs.append(buffer.strip())
+                            buffer = s
+                    if buffer.strip():
+                        clean_subs.append(buffer.strip())
+                else:
+                    clean_subs.append(sub)
+
+            for j, sub in enumerate(clean_subs, 1):
+                if is_valid_clause(sub):
+                    results.append({
+                        "id": f"clause_{counter}{chr(96+j)}",
+                        "label": sub[:80],
+                        "original": sub,
+                        "explanation": "Explanation pending...",
+                        "risk": "Risk pending..."
+                    })
+            counter += 1
+        else:
+            if is_valid_clause(chunk):
+                results.append({
+                    "id": f"clause_{counter}",
+                    "label": chunk.splitlines()[0][:80],
+                    "original": chunk,
+                    "explanation": "Explanation pending...",
+                    "risk": "Risk pending..."
+                })
+            counter += 1
+
+    print(f"[UPLOAD] Final clauses generated: {len(results)}")
+
+    if len(results) == 0:
+        print("[WARN] No valid clauses found → falling back to paragraphs")
+        paras = [p.strip() for p in text.split("\n") if len(p.strip()) > 20]
+        para_counter = 1
+        for p in paras:
+            chunks = [p[i:i+400] for i in range(0, len(p), 400)] if len(p) > 400 else [p]
+            for chunk in chunks:
+                results.append({
+                    "id": f"para_{para_counter}",
+                    "label": chunk[:80],
+                    "original": chunk,
+                    "explanation": "Explanation pending...",
+                    "risk": "Risk pending..."
+                })
+                para_counter += 1
+        print(f"[UPLOAD] Paragraph fallback → {len(results)} items")
+
+    return results
@@ -0,0 +1,105 @@
+# utils/gemini.py
+import asyncio, re, threading
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+
+MODEL_NAME = "gemini-1.5-flash"
+
+# genai.configure() swaps a process-wide setting and GenerativeModel only
+# creates its client on first use, so concurrent callers could send a request
+# with another thread's key. Configure + client creation therefore happen
+# under one lock, and the client is pinned on a model cached per key.
+_lock = threading.Lock()
+_models = {}
+
+
+def model_for(api_key: str):
+    """GenerativeModel bound to api_key (shared across threads)."""
+    with _lock:
+        model = _models.get(api_key)
+        if model is None:
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(MODEL_NAME)
+            model._client = genai_client.get_default_generative_client()
+            _models[api_key] = model
+        return model
+
+
+def amodel_for(api_key: str):
+    """model_for() with an async client (one per key per event loop; call from a coroutine)."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        model = _models.get((api_key, loop))
+        if model is None:
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(MODEL_NAME)
+            model._async_client = genai_client.get_default_generative_async_client()
+            _models[(api_key, loop)] = model
+        return model
+
+
+# 429s carry the server's hint as "Please retry in 23.4s" or "retry_delay { seconds: 23 }"
+_RETRY_HINT = re.compile(r"retry in ([\d.]+)\s*s|retry_delay\s*\{\s*seconds:\s*(\d+)", re.I)
+
+
+def retry_hint(e):
+    """Seconds the server asked us to wait before using the key again (None if not given)."""
+    m = _RETRY_HINT.search(str(e))
+    return float(m.group(1) or m.group(2)) if m else None
+
+
+def rotate_on_error(key_manager, e, api_key, idx) -> bool:
+    """
+    Rotate keys on quota/invalid-key errors → True means try the next key.
+    A quota error also rests the key, so admission stops counting it as capacity.
+    """
+    msg = str(e).lower()
+    if "429" in msg or "quota" in msg:
+        print(f"[WARN] Gemini quota exceeded on key {idx} ({key_manager.env_var}) → rotating…")
+        key_manager.mark_exhausted(api_key, retry_hint(e))
+        key_manager.rotate_key()
+        return True
+    elif "api key not valid" in msg or "invalid" in msg:
+        print(f"[WARN] Gemini invalid key {idx} ({key_manager.env_var}) → rotating…")
+        key_manager.rotate_key()
+        return True
+    return False
+
+
+def generate(key_manager, prompt, spread: bool = False):
+    """
+    (reply text or None, (key idx, total, calls)) from the first key that answers.
+    Quota / invalid-key errors move on to the next key (each tried once);
+    any other error, or every key failing, raises.
+    spread=True picks the least-used key per call (for parallel fan-out).
+    """
+    pick = key_manager.least_used_key if spread else key_manager.get_key
+    error = None
+    for _ in range(len(key_manager.keys)):
+        api_key, idx, total, count = pick(return_meta=True)
+        try:
+            resp = model_for(api_key).generate_content(prompt)
+        except Exception as e:
+            if not rotate_on_error(key_manager, e, api_key, idx):
+                raise
+            error = e
+            continue
+        return (resp.text.strip() if resp and resp.text else None), (idx, total, count)
+    raise error
+
+
+async def agenerate(key_manager, prompt, spread: bool = False):
+    """generate() with the async client (same rotation rules)."""
+    pick = key_manager.least_used_key if spread else key_manager.get_key
+    error = None
+    for _ in range(len(key_manager.keys)):
+        api_key, idx, total, count = pick(return_meta=True)
+        try:
+            resp = await amodel_for(api_key).generate_content_async(prompt)
+        except Exception as e:
+            if not rotate_on_error(key_manager, e, api_key, idx):
+                raise
+            error = e
+            continue
+        return (resp.text.strip() if resp and resp.text else None), (idx, total, count)
+    raise error
@@ -0,0 +1,149 @@
+# utils/scheduler.py
+import heapq, itertools, threading, time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from key_manager import CALLS_PER_MINUTE
+
+# ------------------ Priorities ------------------
+USER = 0        # user clicked a clause → always first
+PREFETCH = 10   # speculative work after upload
+
+PREFETCH_RESERVE = 0.25   # keep this share of the key pool free for users
+IDLE_POLL = 0.5           # seconds between capacity re-checks when holding back
+
+
+class _Task:
+    __slots__ = ("priority", "seq", "group", "key", "fn", "future", "cancelled")
+
+    def __init__(self, priority, seq, group, key, fn):
+        self.priority = priority
+        self.seq = seq
+        self.group = group
+        self.key = key
+        self.fn = fn
+        self.future = Future()
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class PriorityScheduler:
+    """
+    Per-process background scheduler for Gemini work.
+    - tasks are grouped (one group per document) and keyed (one key per clause)
+    - prefetch only runs while no user request is in flight and the key pool
+      has more than PREFETCH_RESERVE of its capacity to spare
+    - a user request can claim a queued task (run it inline instead) or join
+      a running one, so the same clause is never analyzed twice
+    """
+
+    def __init__(self, key_manager, workers: int = 2):
+        self.key_manager = key_manager
+        self.heap = []
+        self.tasks = {}          # (group, key) → _Task (queued or running)
+        self.seq = itertools.count()
+        self.foreground_count = 0
+        self.cond = threading.Condition()
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"scheduler-{i}", daemon=True).start()
+
+    # ---------- submit / cancel ----------
+    def submit(self, group, key, fn, priority: int = PREFETCH):
+        """Queue fn() unless the same (group, key) is already queued/running."""
+        with self.cond:
+            existing = self.tasks.get((group, key))
+            if existing is not None:
+                return existing.future
+            task = _Task(priority, next(self.seq), group, key, fn)
+            self.tasks[(group, key)] = task
+            heapq.heappush(self.heap, task)
+            self.cond.notify()
+            return task.future
+
+    def claim(self, group, key):
+        """
+        Called by a user request before doing the work itself.
+        Returns the running task's Future to wait on, or None if the caller
+        should run the work inline (a queued copy, if any, is dropped).
+        """
+        with self.cond:
+            task = self.tasks.get((group, key))
+            if task is None:
+                return None
+            if task.future.running():
+                return task.future
+            self._cancel(task)
+            return None
+
+    def cancel_group(self, group):
+        """Drop all queued work for a document (evicted or reset)."""
+        with self.cond:
+            dropped = [t for t in self.tasks.values() if t.group == group and not t.future.running()]
+            for t in dropped:
+                self._cancel(t)
+        if dropped:
+            print(f"[SCHED] Dropped {len(dropped)} queued task(s) for {group}")
+
+    def cancel_all(self):
+        with self.cond:
+            dropped = [t for t in self.tasks.values() if not t.future.running()]
+            for t in dropped:
+                self._cancel(t)
+        if dropped:
+            print(f"[SCHED] Dropped {len(dropped)} queued task(s)")
+
+    def _cancel(self, task):
+        task.cancelled = True
+        task.future.cancel()
+        self.tasks.pop((task.group, task.key), None)
+
+    # ---------- foreground tracking ----------
+    @contextmanager
+    def foreground(self):
+        """Mark a user request as in flight → prefetch holds back meanwhile."""
+        with self.cond:
+            self.foreground_count += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.foreground_count -= 1
+                self.cond.notify_all()
+
+    # ---------- workers ----------
+    def _can_run(self, task) -> bool:
+        if task.priority <= USER:
+            return True
+        if self.foreground_count > 0:
+            return False
+        total = len(self.key_manager.keys) * CALLS_PER_MINUTE
+        return self.key_manager.spare_capacity() > total * PREFETCH_RESERVE
+
+    def _next_task(self):
+        with self.cond:
+            while True:
+                while self.heap and self.heap[0].cancelled:
+                    heapq.heappop(self.heap)
+                if self.heap and self._can_run(self.heap[0]):
+                    task = heapq.heappop(self.heap)
+                    if task.future.set_running_or_notify_cancel():
+                        return task
+                    continue
+                self.cond.wait(timeout=IDLE_POLL)
+
+    def _worker(self):
+        while True:
+            task = self._next_task()
+            started = time.time()
+            try:
+                task.future.set_result(task.fn())
+            except Exception as e:
+                print(f"[WARN] Scheduled task {task.key} failed: {e}")
+                task.future.set_exception(e)
+            finally:
+                with self.cond:
+                    if self.tasks.get((task.group, task.key)) is task:
+                        del self.tasks[(task.group, task.key)]
+            print(f"[SCHED] {task.group}/{task.key} done in {time.time() - started:.1f}s")
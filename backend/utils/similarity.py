@@ -0,0 +1,155 @@
+# utils/similarity.py
+import re, hashlib, random, threading
+from array import array
+
+# ------------------ Config ------------------
+NUM_PERM = 64          # signature length
+BANDS = 16             # LSH bands (rows per band = NUM_PERM // BANDS)
+SHINGLE_WORDS = 3
+MIN_SHINGLES = 5       # shorter clauses are too generic to match safely
+
+_PRIME = (1 << 31) - 1   # signature values fit in an unsigned 32-bit array
+_rng = random.Random(20250917)   # fixed seed → signatures stable across restarts
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Shingles can't tell "shall" from "shall not" or 30 days from 90 days → a
+# match is only reused when these tokens agree exactly.
+NEGATIONS = {"not", "no", "never", "without", "except", "unless", "nor", "neither", "cannot"}
+_HEADING_NUMBER = re.compile(r"^\s*(?:\(?\d+[.)]|\d+(?:\.\d+)+\.?)\s+")   # "12." / "(3)" / "4.2" → not a quantity
+_GUARD_TOKEN = re.compile(r"[a-z]*n['’]t\b|\d+(?:[.,]\d+)*|[a-z]+|[$₹€£%]")
+_QUANTITY_WORDS = {
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "fifteen", "twenty", "thirty", "forty", "fifty", "sixty", "ninety",
+    "hundred", "thousand", "lakh", "lakhs", "crore", "crores", "million", "billion",
+    "half", "double", "twice", "percent", "rs", "inr", "usd", "rupees", "dollars",
+    "hour", "hours", "day", "days", "week", "weeks", "month", "months", "year", "years",
+}
+
+LOAD_QUERY = {"minhash": {"$exists": True}, "model_used": {"$ne": "None"}}   # no fallback rows
+LOAD_FIELDS = {"_id": 0, "doc": 1, "id": 1, "minhash": 1, "original": 1}
+
+
+def shingles(text: str):
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def minhash(text: str):
+    """MinHash signature of the clause's word 3-grams (None if too short)."""
+    grams = shingles(text)
+    if len(grams) < MIN_SHINGLES:
+        return None
+    hashes = [
+        int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little")
+        for g in grams
+    ]
+    return array("I", (min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS))
+
+
+def guard(text: str):
+    """Negations (with counts) + numbers / amounts / durations that must match for reuse."""
+    negations, quantities = [], set()
+    for tok in _GUARD_TOKEN.findall(_HEADING_NUMBER.sub("", text.lower(), count=1)):
+        if tok in NEGATIONS:
+            negations.append(tok)
+        elif tok.endswith(("n't", "n’t")):   # don't, won't, shouldn’t …
+            negations.append("not")
+        elif tok[0].isdigit():
+            quantities.add(tok.replace(",", ""))
+        elif tok in _QUANTITY_WORDS or not tok.isalpha():
+            quantities.add(tok)
+    return tuple(sorted(negations)), frozenset(quantities)
+
+
+def similarity(sig_a, sig_b) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+class ClauseIndex:
+    """
+    In-memory MinHash-LSH index over analyzed clauses.
+    Signatures live in one flat array('I'); buckets map a band hash to entry
+    numbers, so a lookup only compares against clauses sharing a band.
+    Each entry also keeps its guard(), checked before a match is returned.
+    """
+
+    def __init__(self):
+        self.rows = NUM_PERM // BANDS
+        self.signatures = array("I")
+        self.refs = []           # entry number → (doc, clause_id)
+        self.guards = []         # entry number → guard(text)
+        self.seen = {}           # (doc, clause_id) → entry number
+        self.buckets = {}        # (band, band hash) → [entry numbers]
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    def __len__(self):
+        return len(self.refs)
+
+    def _bands(self, sig):
+        for b in range(BANDS):
+            yield b, hash(tuple(sig[b * self.rows:(b + 1) * self.rows]))
+
+    def add(self, doc, clause_id, sig, text: str):
+        if sig is None:
+            return
+        with self.lock:
+            if (doc, clause_id) in self.seen:
+                return
+            n = len(self.refs)
+            self.refs.append((doc, clause_id))
+            self.guards.append(guard(text))
+            self.seen[(doc, clause_id)] = n
+            self.signatures.extend(sig)
+            for band in self._bands(sig):
+                self.buckets.setdefault(band, []).append(n)
+
+    def lookup(self, sig, text: str, threshold: float, exclude=None):
+        """Best (doc, clause_id, similarity) at or above threshold with the same guard(), else None."""
+        if sig is None:
+            return None
+        wanted = guard(text)
+        with self.lock:
+            candidates = set()
+            for band in self._bands(sig):
+                candidates.update(self.buckets.get(band, ()))
+            best = None
+            for n in candidates:
+                if self.refs[n] == exclude or self.guards[n] != wanted:
+                    continue
+                score = similarity(sig, self.signatures[n * NUM_PERM:(n + 1) * NUM_PERM])
+                if score >= threshold and (best is None or score > best[2]):
+                    best = (*self.refs[n], score)
+            return best
+
+    def _add_row(self, row):
+        if len(row.get("minhash", ())) == NUM_PERM:
+            self.add(row["doc"], row["id"], array("I", row["minhash"]), row.get("original", ""))
+
+    def load(self, collection):
+        """Rebuild from signatures persisted next to the analyses (once per process)."""
+        if self.loaded:
+            return
+        self.loaded = True
+        try:
+            for row in collection.find(LOAD_QUERY, LOAD_FIELDS):
+                self._add_row(row)
+            print(f"[SIMILARITY] Loaded {len(self)} clause signatures from MongoDB")
+        except Exception as e:
+            print(f"[WARN] MongoDB unavailable → similarity index starts empty: {e}")
+
+    async def aload(self, collection):
+        """load() for an async (motor) collection."""
+        if self.loaded:
+            return
+        self.loaded = True
+        try:
+            async for row in collection.find(LOAD_QUERY, LOAD_FIELDS):
+                self._add_row(row)
+            print(f"[SIMILARITY] Loaded {len(self)} clause signatures from MongoDB")
+        except Exception as e:
+            print(f"[WARN] MongoDB unavailable → similarity index starts empty: {e}")
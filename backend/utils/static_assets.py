@@ -0,0 +1,99 @@
+# utils/static_assets.py
+import os, re, gzip, hashlib, mimetypes
+from flask import Response, request
+
+try:
+    import brotli   # optional → gzip only without it
+except ImportError:
+    brotli = None
+
+# Vite output: assets/<name>-<8 char hash>.<ext> → content never changes for a URL
+HASHED_ASSET = re.compile(r"^assets/.+-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$")
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_SIZE = 512
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"   # index.html etc. → always revalidate (cheap 304s)
+
+
+class _Asset:
+    __slots__ = ("body", "mimetype", "etag", "cache_control")
+
+    def __init__(self, body, mimetype, etag, cache_control):
+        self.body = body           # encoding → bytes
+        self.mimetype = mimetype
+        self.etag = etag           # encoding → etag (one per representation)
+        self.cache_control = cache_control
+
+
+class StaticAssets:
+    """
+    In-memory manifest of the built frontend, made once at startup.
+    Every file is read, hashed for its ETag and (if worth it) compressed to
+    gzip / brotli up front; `.gz` / `.br` files already on disk are used as-is.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.assets = {}
+        total = 0
+        for dirpath, _, files in os.walk(root):
+            for name in files:
+                if name.endswith((".gz", ".br")):
+                    continue
+                full = os.path.join(dirpath, name)
+                rel = os.path.relpath(full, root).replace(os.sep, "/")
+                self.assets[rel] = self._load(rel, full)
+                total += len(self.assets[rel].body["identity"])
+        self.index = self.assets.get("index.html")
+        print(f"[STATIC] Manifest: {len(self.assets)} files, {total // 1024} KiB "
+              f"({'gzip+br' if brotli else 'gzip'})")
+
+    def _load(self, rel, full):
+        with open(full, "rb") as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+        digest = hashlib.sha256(data).hexdigest()[:20]
+
+        body = {"identity": data}
+        if mimetype.startswith(COMPRESSIBLE) and len(data) >= MIN_COMPRESS_SIZE:
+            body["gzip"] = self._precompressed(full + ".gz") or gzip.compress(data, 9, mtime=0)
+            if brotli is not None or os.path.exists(full + ".br"):
+                body["br"] = self._precompressed(full + ".br") or brotli.compress(data, quality=11)
+            body = {enc: b for enc, b in body.items() if enc == "identity" or len(b) < len(data)}
+
+        etag = {enc: f"{digest}-{enc}" if enc != "identity" else digest for enc in body}
+        cache_control = IMMUTABLE if HASHED_ASSET.match(rel) else REVALIDATE
+        return _Asset(body, mimetype, etag, cache_control)
+
+    @staticmethod
+    def _precompressed(path):
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+        return None
+
+    def serve(self, path: str):
+        """Response for `path`, falling back to index.html (SPA routing)."""
+        asset = self.assets.get(path) or self.index
+        if asset is None:
+            return Response("Not found", status=404)
+
+        encoding = request.accept_encodings.best_match(
+            [enc for enc in ("br", "gzip") if enc in asset.body]
+        ) or "identity"
+        etag = asset.etag[encoding]
+
+        headers = {
+            "Cache-Control": asset.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+
+        if request.if_none_match.contains_weak(etag):
+            resp = Response(status=304, headers=headers)
+        else:
+            if encoding != "identity":
+                headers["Content-Encoding"] = encoding
+            resp = Response(asset.body[encoding], mimetype=asset.mimetype, headers=headers)
+        resp.set_etag(etag)
+        return resp
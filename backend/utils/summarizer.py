@@ -0,0 +1,271 @@
+# utils/summarizer.py
+import re, math, hashlib, threading, asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.gemini import generate, agenerate
+
+# ------------------ Config ------------------
+CHUNK_TOKEN_BUDGET = 3000      # per map call (≈ 4 chars / token)
+REDUCE_FAN_IN = 8              # max partial summaries merged per reduce call
+MAX_PARALLEL_CALLS = 8
+CACHE_SIZE = 2048              # chunk summaries kept in memory
+CALL_ATTEMPTS = 2              # per chunk; quota / invalid-key rotation happens inside each attempt
+
+CLAUSE_BOUNDARY = re.compile(r'(?=\n?\d+\.\s)')
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.;])\s+')
+
+FINAL_PROMPT = "Summarize this legal/official document in 5 concise lines:\n{text}"
+MAP_PROMPT = (
+    "Summarize this section of a legal/official document in 3-6 concise lines. "
+    "Keep parties, obligations, amounts, dates and risks:\n{text}"
+)
+REDUCE_PROMPT = (
+    "These are summaries of consecutive sections of one legal/official document. "
+    "Merge them into a single summary of at most 8 concise lines:\n{text}"
+)
+UNAVAILABLE = "⚠️ Summary not available."
+PARTIAL_NOTE = "⚠️ Partial summary — some sections could not be summarized.\n"
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _split_oversized(piece: str, budget: int):
+    """Break a clause that alone exceeds the budget on sentence boundaries."""
+    if estimate_tokens(piece) <= budget:
+        return [piece]
+    parts, buffer = [], ""
+    for s in SENTENCE_BOUNDARY.split(piece):
+        if buffer and estimate_tokens(buffer + " " + s) > budget:
+            parts.append(buffer)
+            buffer = s
+        else:
+            buffer = (buffer + " " + s).strip()
+        # a single run-on "sentence" → hard cut
+        while estimate_tokens(buffer) > budget:
+            parts.append(buffer[:budget * 4])
+            buffer = buffer[budget * 4:]
+    if buffer:
+        parts.append(buffer)
+    return parts
+
+
+def chunk_text(text: str, budget: int = CHUNK_TOKEN_BUDGET):
+    """
+    Pack clauses into chunks of at most `budget` tokens.
+    A chunk is also closed early (once half full) after a clause whose hash
+    hits 1-in-4, so boundaries depend on content rather than position and an
+    edit early in a document doesn't shift every chunk after it → cache hits.
+    """
+    pieces = []
+    for clause in CLAUSE_BOUNDARY.split(text):
+        clause = clause.strip()
+        if clause:
+            pieces.extend(_split_oversized(clause, budget))
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and estimate_tokens(current + " " + piece) > budget:
+            chunks.append(current)
+            current = ""
+        current = (current + " " + piece).strip()
+        digest = hashlib.sha1(piece.encode("utf-8")).digest()
+        if estimate_tokens(current) >= budget // 2 and digest[0] % 4 == 0:
+            chunks.append(current)
+            current = ""
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class SummaryEngine:
+    """
+    Map-reduce summarizer over the whole document.
+    - map: chunk summaries in parallel across the key pool (cached by content hash)
+    - reduce: merge partial summaries REDUCE_FAN_IN at a time until one remains
+    """
+
+    def __init__(self, key_manager, collection=None):
+        self.key_manager = key_manager
+        self.collection = collection   # optional Mongo store for chunk summaries
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    # ---------- cache ----------
+    def _cache_get(self, digest: str):
+        with self.lock:
+            if digest in self.cache:
+                self.cache.move_to_end(digest)
+                return self.cache[digest]
+        if self.collection is not None:
+            try:
+                hit = self.collection.find_one({"_id": digest}, {"summary": 1})
+                if hit:
+                    self._cache_put(digest, hit["summary"], persist=False)
+                    return hit["summary"]
+            except Exception as e:
+                print(f"[WARN] MongoDB unavailable → skipping summary cache: {e}")
+        return None
+
+    def _cache_put(self, digest: str, summary: str, persist: bool = True):
+        with self.lock:
+            self.cache[digest] = summary
+            self.cache.move_to_end(digest)
+            while len(self.cache) > CACHE_SIZE:
+                self.cache.popitem(last=False)
+        if persist and self.collection is not None:
+            try:
+                self.collection.update_one(
+                    {"_id": digest}, {"$set": {"summary": summary}}, upsert=True
+                )
+            except Exception as e:
+                print(f"[WARN] Could not save summary to MongoDB: {e}")
+
+    # ---------- gemini ----------
+    def _generate(self, prompt: str):
+        for attempt in range(CALL_ATTEMPTS):
+            try:
+                text, _ = generate(self.key_manager, prompt, spread=True)
+                if text:
+                    return text
+            except Exception as e:
+                print(f"[WARN] Summary call failed (attempt {attempt + 1}/{CALL_ATTEMPTS}): {e}")
+                self.key_manager.rotate_key()
+        return None
+
+    def _summarize_cached(self, template: str, text: str):
+        digest = hashlib.sha256((template + "\0" + text).encode("utf-8")).hexdigest()
+        cached = self._cache_get(digest)
+        if cached is not None:
+            return cached
+        summary = self._generate(template.format(text=text))
+        if summary:  # never cache failures
+            self._cache_put(digest, summary)
+        return summary
+
+    def _parallel(self, template: str, texts):
+        if len(texts) == 1:
+            return [self._summarize_cached(template, texts[0])]
+        workers = min(len(texts), MAX_PARALLEL_CALLS, max(1, len(self.key_manager.keys) * 2))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(lambda t: self._summarize_cached(template, t), texts))
+
+    # ---------- async (ASGI path) ----------
+    async def _agenerate(self, prompt: str):
+        for attempt in range(CALL_ATTEMPTS):
+            try:
+                text, _ = await agenerate(self.key_manager, prompt, spread=True)
+                if text:
+                    return text
+            except Exception as e:
+                print(f"[WARN] Summary call failed (attempt {attempt + 1}/{CALL_ATTEMPTS}): {e}")
+                self.key_manager.rotate_key()
+        return None
+
+    async def _asummarize_cached(self, template: str, text: str):
+        digest = hashlib.sha256((template + "\0" + text).encode("utf-8")).hexdigest()
+        cached = await asyncio.to_thread(self._cache_get, digest)
+        if cached is not None:
+            return cached
+        summary = await self._agenerate(template.format(text=text))
+        if summary:
+            await asyncio.to_thread(self._cache_put, digest, summary)
+        return summary
+
+    async def _aparallel(self, template: str, texts):
+        limit = asyncio.Semaphore(min(MAX_PARALLEL_CALLS, max(1, len(self.key_manager.keys) * 2)))
+
+        async def one(t):
+            async with limit:
+                return await self._asummarize_cached(template, t)
+
+        return await asyncio.gather(*(one(t) for t in texts))
+
+    # ---------- public ----------
+    @staticmethod
+    def _reduce_groups(partials):
+        """Group partial summaries for one reduce level (None → nothing left to merge)."""
+        groups, current = [], []
+        for p in partials:
+            joined = "\n\n".join(current + [p])
+            if current and (len(current) >= REDUCE_FAN_IN or estimate_tokens(joined) > CHUNK_TOKEN_BUDGET):
+                groups.append(current)
+                current = []
+            current.append(p)
+        groups.append(current)
+        if len(groups) == 1 or len(groups) == len(partials):
+            return None
+        return ["\n\n".join(g) for g in groups]
+
+    @staticmethod
+    def _finish(summary, complete):
+        """(summary text, complete?) → a summary missing sections says so."""
+        if not summary:
+            return UNAVAILABLE, False
+        return (summary, True) if complete else (PARTIAL_NOTE + summary, False)
+
+    @staticmethod
+    def max_calls(text: str) -> int:
+        """Gemini calls summarize(text) makes with nothing cached → its admission cost."""
+        n = len(chunk_text(text))
+        if n <= 1:
+            return n
+        calls, level = n + 1, n   # map + final
+        while level > 1:
+            level = math.ceil(level / REDUCE_FAN_IN)
+            calls += level if level > 1 else 0
+        return calls
+
+    def summarize(self, text: str):
+        """
+        (summary, complete). complete is False when any chunk or merge call
+        failed → the caller should not keep it as the document's summary.
+        """
+        chunks = chunk_text(text)
+        if not chunks:
+            return UNAVAILABLE, False
+        if len(chunks) == 1:
+            return self._finish(self._summarize_cached(FINAL_PROMPT, chunks[0]), True)
+
+        partials = [s for s in self._parallel(MAP_PROMPT, chunks) if s]
+        complete = len(partials) == len(chunks)
+        print(f"[SUMMARY] map: {len(chunks)} chunks → {len(partials)} partial summaries")
+
+        # hierarchical reduce
+        while len(partials) > 1:
+            groups = self._reduce_groups(partials)
+            if groups is None:
+                break
+            partials = [m for m in self._parallel(REDUCE_PROMPT, groups) if m]
+            complete = complete and len(partials) == len(groups)
+            print(f"[SUMMARY] reduce: {len(groups)} groups → {len(partials)} summaries")
+
+        if not partials:
+            return UNAVAILABLE, False
+        return self._finish(self._summarize_cached(FINAL_PROMPT, "\n\n".join(partials)), complete)
+
+    async def asummarize(self, text: str):
+        """Same map-reduce as summarize(), with the Gemini calls gathered on the event loop."""
+        chunks = chunk_text(text)
+        if not chunks:
+            return UNAVAILABLE, False
+        if len(chunks) == 1:
+            return self._finish(await self._asummarize_cached(FINAL_PROMPT, chunks[0]), True)
+
+        partials = [s for s in await self._aparallel(MAP_PROMPT, chunks) if s]
+        complete = len(partials) == len(chunks)
+        print(f"[SUMMARY] map: {len(chunks)} chunks → {len(partials)} partial summaries")
+
+        while len(partials) > 1:
+            groups = self._reduce_groups(partials)
+            if groups is None:
+                break
+            partials = [m for m in await self._aparallel(REDUCE_PROMPT, groups) if m]
+            complete = complete and len(partials) == len(groups)
+            print(f"[SUMMARY] reduce: {len(groups)} groups → {len(partials)} summaries")
+
+        if not partials:
+            return UNAVAILABLE, False
+        return self._finish(await self._asummarize_cached(FINAL_PROMPT, "\n\n".join(partials)), complete)
@@ -0,0 +1,226 @@
+# utils/upload_store.py
+import os, time, mmap, hashlib, tempfile, threading
+from collections import Counter
+from contextlib import contextmanager
+from flask import Request
+
+# ------------------ Config ------------------
+CHUNK_SIZE = 1 << 16          # 64 KiB copy/hash chunks
+EVICT_INTERVAL = 60           # seconds between background sweeps
+STALE_TMP_AGE = 3600          # leftover temp files older than this are removed at startup
+IN_USE_GRACE = 600            # blobs used this recently may be pinned by another worker → kept
+
+
+class Blob:
+    __slots__ = ("digest", "size", "deduped")
+
+    def __init__(self, digest, size, deduped):
+        self.digest = digest
+        self.size = size
+        self.deduped = deduped
+
+
+class HashingSpool:
+    """
+    Temp file that hashes everything written to it. Used as werkzeug's
+    upload stream, so the body lands on disk (and is hashed) while the
+    multipart form is parsed — committing it is just a rename.
+    Deleted on close unless the store committed it.
+    """
+
+    def __init__(self, tmp_dir):
+        fd, self.path = tempfile.mkstemp(dir=tmp_dir, prefix="upload-")
+        self.file = os.fdopen(fd, "w+b")
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.committed = False
+
+    def write(self, data):
+        self.hash.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def close(self):
+        self.file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):   # read/seek/tell/readline/... → real file
+        return getattr(self.file, name)
+
+
+class UploadStore:
+    """
+    Content-addressed upload storage: blobs/<ab>/<sha256>.
+    - identical uploads are stored once
+    - total size is bounded; least recently used blobs are evicted by a
+      background thread (never while a request has them pinned)
+    Several worker processes may share the directory: usage is re-read from
+    disk on every sweep and mtime marks last use. Pins are per process, so
+    a blob touched within IN_USE_GRACE is never evicted by any worker.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.blob_dir = os.path.join(root, "blobs")
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.total = 0                 # bytes on disk at the last sweep + our writes since
+        self.pins = Counter()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self._scan()
+        threading.Thread(target=self._evictor, name="upload-evictor", daemon=True).start()
+
+    def _scan(self):
+        """Measure the store and drop stale temp files."""
+        now = time.time()
+        for name in os.listdir(self.tmp_dir):
+            tmp = os.path.join(self.tmp_dir, name)
+            try:
+                if now - os.path.getmtime(tmp) > STALE_TMP_AGE:   # other workers may be mid-upload
+                    os.remove(tmp)
+            except FileNotFoundError:   # committed or cleaned up by another worker meanwhile
+                continue
+        blobs = self._disk_blobs()
+        self.total = sum(size for _, _, size in blobs)
+        print(f"[STORE] {len(blobs)} blobs, {self.total // (1 << 20)} MiB / {self.max_bytes // (1 << 20)} MiB")
+
+    def _disk_blobs(self):
+        """[(mtime, digest, size)] of every stored blob, least recently used first."""
+        found = []
+        for dirpath, _, files in os.walk(self.blob_dir):
+            for name in files:
+                try:
+                    st = os.stat(os.path.join(dirpath, name))
+                except FileNotFoundError:   # evicted by another worker mid-walk
+                    continue
+                found.append((st.st_mtime, name, st.st_size))
+        return sorted(found)
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    # ---------- write ----------
+    @contextmanager
+    def save(self, stream):
+        """
+        Store an upload stream (HashingSpool fast path, else chunked copy + hash)
+        and yield its Blob, pinned until the block exits.
+        """
+        spool = stream if isinstance(stream, HashingSpool) else None
+        if spool is None:
+            spool = HashingSpool(self.tmp_dir)
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                spool.write(chunk)
+        spool.file.flush()
+
+        digest = spool.hash.hexdigest()
+        target = self.path(digest)
+        with self.lock:
+            deduped = os.path.exists(target)
+            if deduped:
+                try:
+                    os.utime(target)
+                except FileNotFoundError:   # evicted by another worker just now
+                    deduped = False
+            if not deduped:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(spool.path, target)
+                spool.committed = True
+                self.total += spool.size
+            self.pins[digest] += 1   # pinned before eviction can see it
+            over = self.total > self.max_bytes
+        if spool is not stream:
+            spool.close()
+        if over:
+            self.wakeup.set()
+        try:
+            yield Blob(digest, spool.size, deduped)
+        finally:
+            self._unpin(digest)
+
+    # ---------- read ----------
+    @contextmanager
+    def pinned(self, digest: str):
+        """Yield the blob path; it won't be evicted until the block exits."""
+        path = self.path(digest)
+        with self.lock:
+            os.utime(path)   # FileNotFoundError if gone; mtime = last use for every worker
+            self.pins[digest] += 1
+        try:
+            yield path
+        finally:
+            self._unpin(digest)
+
+    def _unpin(self, digest: str):
+        with self.lock:
+            self.pins[digest] -= 1
+            if not self.pins[digest]:
+                del self.pins[digest]
+
+    @contextmanager
+    def open(self, digest: str):
+        """Read-only file handle on the stored blob (no copy)."""
+        with self.pinned(digest) as path, open(path, "rb") as f:
+            yield f
+
+    @contextmanager
+    def mmap(self, digest: str):
+        """Read-only memory map of the stored blob (no copy)."""
+        with self.open(digest) as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mm
+            finally:
+                mm.close()
+
+    # ---------- eviction ----------
+    def evict(self):
+        """Delete least recently used blobs until the store, as found on disk, is under max_bytes."""
+        blobs = self._disk_blobs()
+        total = sum(size for _, _, size in blobs)
+        removed, now = 0, time.time()
+        with self.lock:
+            for mtime, digest, size in blobs:
+                if total <= self.max_bytes:
+                    break
+                if self.pins[digest] or now - mtime < IN_USE_GRACE:
+                    continue
+                try:
+                    os.remove(self.path(digest))
+                except FileNotFoundError:   # another worker got there first
+                    pass
+                total -= size
+                removed += 1
+            self.total = total
+        if removed:
+            print(f"[STORE] Evicted {removed} blob(s) → {total // (1 << 20)} MiB")
+        if total > self.max_bytes:
+            print(f"[STORE] Still {total // (1 << 20)} MiB after eviction (blobs in use)")
+
+    def _evictor(self):
+        while True:
+            self.wakeup.wait(timeout=EVICT_INTERVAL)
+            self.wakeup.clear()
+            try:
+                self.evict()
+            except Exception as e:
+                print(f"[WARN] Upload eviction failed: {e}")
+
+
+def make_request_class(store: UploadStore):
+    """Flask request class whose file uploads stream straight into `store`."""
+
+    class StreamingUploadRequest(Request):
+        def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+            return HashingSpool(store.tmp_dir)
+
+    return StreamingUploadRequest